@@ -0,0 +1,217 @@
+import os
+import json
+import time
+import uuid
+import threading
+
+from youtube_analyzer import YouTubeAnalyzer, DB_PATH, connect_database
+
+# 完了していないジョブの進捗ストリームを一度に保持する最大秒数。
+# gunicornのワーカータイムアウトより短くし、ブラウザ（EventSource）に再接続させて続きを受け取る
+SSE_MAX_SECONDS = float(os.environ.get('SSE_MAX_SECONDS', 25))
+SSE_POLL_SECONDS = 0.5
+
+# 実行中のジョブはこの間隔で生存を記録する。JOB_STALE_SECONDS 以上記録のないジョブは
+# ワーカーの再起動・強制終了で中断されたものとして失敗にする
+JOB_HEARTBEAT_SECONDS = 10
+JOB_STALE_SECONDS = float(os.environ.get('JOB_STALE_SECONDS', 60))
+# 完了したジョブと進捗イベントを残す時間（時間）
+ANALYSIS_JOBS_RETAIN_HOURS = float(os.environ.get('ANALYSIS_JOBS_RETAIN_HOURS', 24))
+
+def publish_event(job_id, event, data):
+    with connect_database(DB_PATH) as conn:
+        conn.execute(
+            'INSERT INTO analysis_events (job_id, event, data) VALUES (?, ?, ?)',
+            (job_id, event, json.dumps(data, ensure_ascii=False))
+        )
+        conn.commit()
+
+def finish_job(job_id, status, result):
+    with connect_database(DB_PATH) as conn:
+        conn.execute('''
+            UPDATE analysis_jobs
+            SET status = ?, result = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'running'
+        ''', (status, json.dumps(result, ensure_ascii=False), job_id))
+        conn.commit()
+
+def keep_alive(job_id, stopped):
+    while not stopped.wait(JOB_HEARTBEAT_SECONDS):
+        try:
+            with connect_database(DB_PATH) as conn:
+                conn.execute(
+                    "UPDATE analysis_jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running'",
+                    (time.time(), job_id)
+                )
+                conn.commit()
+        except Exception as e:
+            print(f"分析ジョブの生存記録でエラー ({job_id}): {str(e)}")
+
+def expire_stale_jobs(conn):
+    """生存記録の途絶えた実行中のジョブを失敗にし、進捗ストリームにも失敗イベントを送る"""
+    cutoff = time.time() - JOB_STALE_SECONDS
+    error = json.dumps({'error': '分析ジョブが中断されました（ワーカーの再起動など）。もう一度実行してください'}, ensure_ascii=False)
+
+    stale = conn.execute(
+        "SELECT id FROM analysis_jobs WHERE status = 'running' AND COALESCE(heartbeat_at, 0) < ?",
+        (cutoff,)
+    ).fetchall()
+    for (job_id,) in stale:
+        cursor = conn.execute('''
+            UPDATE analysis_jobs
+            SET status = 'failed', result = ?, finished_at = CURRENT_TIMESTAMP
+            WHERE id = ? AND status = 'running' AND COALESCE(heartbeat_at, 0) < ?
+        ''', (error, job_id, cutoff))
+        if cursor.rowcount:
+            conn.execute(
+                "INSERT INTO analysis_events (job_id, event, data) VALUES (?, 'failed', ?)",
+                (job_id, error)
+            )
+    conn.commit()
+
+def prune_finished_jobs(conn):
+    # 完了から ANALYSIS_JOBS_RETAIN_HOURS 経ったジョブは進捗イベントごと削除する
+    retain = f'-{ANALYSIS_JOBS_RETAIN_HOURS} hours'
+    conn.execute('''
+        DELETE FROM analysis_events
+        WHERE job_id IN (
+            SELECT id FROM analysis_jobs
+            WHERE status != 'running' AND finished_at < datetime('now', ?)
+        )
+    ''', (retain,))
+    conn.execute(
+        "DELETE FROM analysis_jobs WHERE status != 'running' AND finished_at < datetime('now', ?)",
+        (retain,)
+    )
+
+def run_job(job_id, kind, params):
+    stopped = threading.Event()
+    threading.Thread(target=keep_alive, args=(job_id, stopped), daemon=True).start()
+    try:
+        analyzer = YouTubeAnalyzer()
+        analyzer.progress_callback = lambda event, **data: publish_event(job_id, event, data)
+
+        if kind == 'csv':
+            result = analyzer.analyze_csv_urls()
+        else:
+            result = analyzer.analyze_video_cached(params['video_url'], force=params.get('force', False))
+
+        # 配信中のストリームが完了イベントを取りこぼさないよう、イベントを先に記録する
+        status = 'failed' if result.get('success') is False else 'done'
+        publish_event(job_id, status, result)
+        finish_job(job_id, status, result)
+
+    except Exception as e:
+        print(f"分析ジョブでエラー ({job_id}): {str(e)}")
+        publish_event(job_id, 'failed', {'error': str(e)})
+        finish_job(job_id, 'failed', {'error': str(e)})
+    finally:
+        stopped.set()
+
+def start_job(kind, params=None):
+    """分析をバックグラウンドスレッドで開始し、ジョブIDを返す
+
+    同じ内容のジョブが実行中なら、新しく開始せずにそのジョブIDを返す。
+    """
+    job_id = uuid.uuid4().hex
+    params = params or {}
+    job_key = json.dumps([kind, params], sort_keys=True)
+
+    # テーブルの作成（初回起動時）を兼ねてアナライザーを初期化してから登録する
+    YouTubeAnalyzer()
+    with connect_database(DB_PATH) as conn:
+        expire_stale_jobs(conn)
+        prune_finished_jobs(conn)
+        conn.commit()
+
+        # 他のワーカーと同時に登録しないよう、確認から登録までを1つの書き込みトランザクションにする
+        conn.execute('BEGIN IMMEDIATE')
+        running = conn.execute(
+            "SELECT id FROM analysis_jobs WHERE job_key = ? AND status = 'running'",
+            (job_key,)
+        ).fetchone()
+        if running:
+            conn.rollback()
+            return running[0]
+
+        conn.execute(
+            "INSERT INTO analysis_jobs (id, kind, status, job_key, heartbeat_at) VALUES (?, ?, 'running', ?, ?)",
+            (job_id, kind, job_key, time.time())
+        )
+        conn.execute(
+            'INSERT INTO analysis_events (job_id, event, data) VALUES (?, ?, ?)',
+            (job_id, 'started', json.dumps({'kind': kind, **params}, ensure_ascii=False))
+        )
+        conn.commit()
+
+    threading.Thread(target=run_job, args=(job_id, kind, params), daemon=True).start()
+    return job_id
+
+def get_job(job_id):
+    with connect_database(DB_PATH) as conn:
+        expire_stale_jobs(conn)
+        row = conn.execute(
+            'SELECT id, kind, status, result, created_at, finished_at FROM analysis_jobs WHERE id = ?',
+            (job_id,)
+        ).fetchone()
+
+    if row is None:
+        return None
+
+    return {
+        'id': row[0],
+        'kind': row[1],
+        'status': row[2],
+        'result': json.loads(row[3]) if row[3] else None,
+        'created_at': row[4],
+        'finished_at': row[5]
+    }
+
+def stream_events(job_id, last_event_id=0):
+    """ジョブの進捗イベントをServer-Sent Events形式で返すジェネレーター
+
+    ワーカーをまたいでも配信できるよう、イベントはDBから読み出す。
+    last_event_id（Last-Event-IDヘッダー）以降のイベントから再開する。
+    """
+    deadline = time.monotonic() + SSE_MAX_SECONDS
+    last_write = time.monotonic()
+    yield 'retry: 1000\n\n'
+
+    with connect_database(DB_PATH) as conn:
+        while True:
+            rows = conn.execute('''
+                SELECT seq, event, data
+                FROM analysis_events
+                WHERE job_id = ? AND seq > ?
+                ORDER BY seq
+            ''', (job_id, last_event_id)).fetchall()
+
+            for seq, event, data in rows:
+                last_event_id = seq
+                last_write = time.monotonic()
+                yield f'id: {seq}\nevent: {event}\ndata: {data}\n\n'
+                if event in ('done', 'failed'):
+                    return
+
+            if not rows:
+                job = conn.execute('SELECT status, heartbeat_at FROM analysis_jobs WHERE id = ?', (job_id,)).fetchone()
+                if job is None:
+                    yield 'event: failed\ndata: {"error": "Job not found"}\n\n'
+                    return
+                if job[0] != 'running':
+                    # 完了イベントは送信済み
+                    return
+                if (job[1] or 0) < time.time() - JOB_STALE_SECONDS:
+                    # 実行していたワーカーが落ちている。次の読み出しで失敗イベントを送る
+                    expire_stale_jobs(conn)
+                    continue
+
+            if time.monotonic() >= deadline:
+                # 接続を閉じてブラウザに再接続させる
+                return
+
+            if time.monotonic() - last_write >= 10:
+                # 接続維持のためのコメント行
+                last_write = time.monotonic()
+                yield ': keep-alive\n\n'
+            time.sleep(SSE_POLL_SECONDS)
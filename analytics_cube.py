@@ -0,0 +1,268 @@
+import threading
+
+import numpy as np
+
+def month_key_add(month_key, months):
+    index = (month_key // 100) * 12 + (month_key % 100 - 1) + months
+    return (index // 12) * 100 + index % 12 + 1
+
+def month_key_diff(a, b):
+    # a - b（月数）
+    return ((a // 100) * 12 + a % 100) - ((b // 100) * 12 + b % 100)
+
+class AnalyticsCube:
+    """動画 × 月 のNumPy配列で月別集計を保持するメモリ常駐キャッシュ
+
+    SQLiteの monthly_stats / view_snapshots から一度だけ読み込み、以降は
+    analytics_changes テーブルに記録された動画だけを差分で再読み込みする。
+    月の軸は最古の月から最新の月まで連続しているため、期間指定はスライスで処理できる。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.loaded = False
+        self.last_change = 0
+        self.video_ids = []
+        self.video_index = {}
+        self.titles = []
+        self.published_at = []
+        self.first_snapshot = []
+        self.active = np.zeros(0, dtype=bool)
+        self.first_month = None
+        self.comments = np.zeros((0, 0), dtype=np.int64)
+        self.positive = np.zeros((0, 0), dtype=np.int64)
+        self.negative = np.zeros((0, 0), dtype=np.int64)
+        self.sentiment_sum = np.zeros((0, 0), dtype=np.float64)
+        self.views = np.zeros((0, 0), dtype=np.float64)
+
+    @property
+    def month_count(self):
+        return self.comments.shape[1]
+
+    def month_keys(self):
+        return [month_key_add(self.first_month, i) for i in range(self.month_count)]
+
+    def sync(self, conn):
+        cursor = conn.cursor()
+        if not self.loaded:
+            self.load(cursor)
+            return
+
+        cursor.execute('SELECT seq, video_id FROM analytics_changes WHERE seq > ? ORDER BY seq', (self.last_change,))
+        changes = cursor.fetchall()
+        if not changes:
+            return
+
+        if changes[0][0] > self.last_change + 1:
+            # 未反映の変更が削除済み（prune_analytics_changes）なので全体を再読み込み
+            self.load(cursor)
+            return
+
+        self.last_change = changes[-1][0]
+        if any(video_id is None for _, video_id in changes):
+            # 全削除などの場合は全体を再読み込み
+            self.load(cursor)
+            return
+
+        for video_id in dict.fromkeys(video_id for _, video_id in changes):
+            self.update_video(cursor, video_id)
+
+    def load(self, cursor):
+        self.reset()
+
+        cursor.execute('SELECT COALESCE(MAX(seq), 0) FROM analytics_changes')
+        self.last_change = cursor.fetchone()[0]
+
+        cursor.execute('SELECT id FROM videos')
+        for (video_id,) in cursor.fetchall():
+            self.update_video(cursor, video_id)
+        self.loaded = True
+
+    def ensure_video(self, video_id):
+        if video_id in self.video_index:
+            return self.video_index[video_id]
+
+        index = len(self.video_ids)
+        self.video_ids.append(video_id)
+        self.video_index[video_id] = index
+        self.titles.append('')
+        self.published_at.append('')
+        self.first_snapshot.append('')
+        self.active = np.append(self.active, False)
+        for name in ('comments', 'positive', 'negative', 'sentiment_sum', 'views'):
+            array = getattr(self, name)
+            fill = np.nan if name == 'views' else 0
+            row = np.full((1, array.shape[1]), fill, dtype=array.dtype)
+            setattr(self, name, np.vstack([array, row]))
+        return index
+
+    def ensure_months(self, month_keys):
+        if not month_keys:
+            return
+
+        low, high = min(month_keys), max(month_keys)
+        if self.first_month is None:
+            self.first_month = low
+            before, after = 0, month_key_diff(high, low) + 1
+        else:
+            last_month = month_key_add(self.first_month, self.month_count - 1)
+            before = max(0, month_key_diff(self.first_month, low))
+            after = max(0, month_key_diff(high, last_month))
+            if before:
+                self.first_month = low
+        if not before and not after:
+            return
+
+        for name in ('comments', 'positive', 'negative', 'sentiment_sum', 'views'):
+            array = getattr(self, name)
+            fill = np.nan if name == 'views' else 0
+            setattr(self, name, np.pad(array, ((0, 0), (before, after)), constant_values=fill))
+
+    def month_position(self, month_key):
+        return month_key_diff(month_key, self.first_month)
+
+    def update_video(self, cursor, video_id):
+        cursor.execute('SELECT title, published_at FROM videos WHERE id = ?', (video_id,))
+        video = cursor.fetchone()
+        if video is None:
+            self.remove_video(video_id)
+            return
+
+        cursor.execute('''
+            SELECT month_key, total_comments, positive_comments, negative_comments, avg_sentiment
+            FROM monthly_stats
+            WHERE video_id = ?
+        ''', (video_id,))
+        stats = cursor.fetchall()
+
+        # 月ごとの最新スナップショット（統計の更新で細かく記録されていても月の数だけ読む）
+        cursor.execute('''
+            SELECT
+                CAST(substr(snapshot_date, 1, 4) AS INTEGER) * 100 + CAST(substr(snapshot_date, 6, 2) AS INTEGER) AS month_key,
+                view_count,
+                MAX(snapshot_date)
+            FROM view_snapshots
+            WHERE video_id = ?
+            GROUP BY month_key
+            ORDER BY month_key
+        ''', (video_id,))
+        snapshots = cursor.fetchall()
+
+        cursor.execute('SELECT MIN(snapshot_date) FROM view_snapshots WHERE video_id = ?', (video_id,))
+        first_snapshot = cursor.fetchone()[0]
+
+        self.ensure_months([row[0] for row in stats] + [row[0] for row in snapshots])
+        index = self.ensure_video(video_id)
+
+        self.titles[index], self.published_at[index] = video[0] or '', video[1] or ''
+        self.first_snapshot[index] = first_snapshot or ''
+        self.active[index] = True
+
+        for name in ('comments', 'positive', 'negative', 'sentiment_sum'):
+            getattr(self, name)[index, :] = 0
+        self.views[index, :] = np.nan
+
+        for month_key, total, positive, negative, avg_sentiment in stats:
+            position = self.month_position(month_key)
+            self.comments[index, position] = total or 0
+            self.positive[index, position] = positive or 0
+            self.negative[index, position] = negative or 0
+            self.sentiment_sum[index, position] = (avg_sentiment or 0) * (total or 0)
+
+        for month_key, view_count, _ in snapshots:
+            self.views[index, self.month_position(month_key)] = view_count
+
+    def remove_video(self, video_id):
+        index = self.video_index.get(video_id)
+        if index is None:
+            return
+
+        self.active[index] = False
+        for name in ('comments', 'positive', 'negative', 'sentiment_sum'):
+            getattr(self, name)[index, :] = 0
+        self.views[index, :] = np.nan
+
+    def select(self, video_ids=None, month_from=None, month_to=None):
+        """対象動画の行番号と、期間に対応する月のスライスを返す"""
+        if video_ids is None:
+            rows = np.flatnonzero(self.active)
+        else:
+            rows = np.array(
+                [self.video_index[v] for v in video_ids if v in self.video_index and self.active[self.video_index[v]]],
+                dtype=np.int64
+            )
+
+        if self.first_month is None:
+            return rows, slice(0, 0)
+
+        start = 0 if month_from is None else max(0, self.month_position(month_from))
+        stop = self.month_count if month_to is None else min(self.month_count, self.month_position(month_to) + 1)
+        return rows, slice(start, max(start, stop))
+
+    def comments_matrix(self, video_ids=None, month_from=None, month_to=None):
+        rows, months = self.select(video_ids, month_from, month_to)
+        counts = self.comments[rows, months]
+
+        # コメントのある動画・月だけを残す
+        rows_mask = counts.sum(axis=1) > 0
+        month_mask = counts.sum(axis=0) > 0
+        rows, counts = rows[rows_mask], counts[rows_mask][:, month_mask]
+        month_keys = np.array(self.month_keys()[months], dtype=np.int64)[month_mask]
+
+        order = sorted(range(len(rows)), key=lambda i: self.published_at[rows[i]])
+        return [self.video_ids[rows[i]] for i in order], month_keys.tolist(), counts[order]
+
+    def views_matrix(self, video_ids=None, month_from=None, month_to=None):
+        rows, months = self.select(video_ids, month_from, month_to)
+        views = self.views[rows, months]
+
+        present = ~np.isnan(views)
+        rows_mask = present.any(axis=1)
+        month_mask = present.any(axis=0)
+        rows, views = rows[rows_mask], views[rows_mask][:, month_mask]
+        month_keys = np.array(self.month_keys()[months], dtype=np.int64)[month_mask]
+
+        order = sorted(range(len(rows)), key=lambda i: self.first_snapshot[rows[i]])
+        return [self.video_ids[rows[i]] for i in order], month_keys.tolist(), views[order]
+
+    def rankings(self, field, limit, video_ids=None, month_from=None, month_to=None):
+        """(動画, 月) の組を field の降順で limit 件返す"""
+        rows, months = self.select(video_ids, month_from, month_to)
+        values = getattr(self, field)[rows, months]
+        if values.size == 0:
+            return []
+
+        flat = values.ravel()
+        candidates = np.flatnonzero(self.comments[rows, months].ravel() > 0)
+        if candidates.size > limit:
+            top = candidates[np.argpartition(-flat[candidates], limit - 1)[:limit]]
+        else:
+            top = candidates
+        top = top[np.argsort(-flat[top], kind='stable')]
+
+        width = values.shape[1]
+        result = []
+        for position in top:
+            row, column = rows[position // width], months.start + position % width
+            result.append({
+                'video_id': self.video_ids[row],
+                'title': self.titles[row],
+                'month_key': month_key_add(self.first_month, column),
+                'total_comments': int(self.comments[row, column]),
+                'positive_comments': int(self.positive[row, column]),
+                'negative_comments': int(self.negative[row, column])
+            })
+        return result
+
+_cubes = {}
+_cubes_lock = threading.Lock()
+
+def get_cube(db_path):
+    """プロセス内で共有するキューブを返す（DBファイルごとに1つ）"""
+    with _cubes_lock:
+        if db_path not in _cubes:
+            _cubes[db_path] = AnalyticsCube()
+        return _cubes[db_path]
@@ -1,8 +1,11 @@
-from flask import Flask, render_template, request, jsonify
+from flask import Flask, render_template, request, jsonify, Response, stream_with_context, send_file, g
 import os
+import time
 import threading
 from dotenv import load_dotenv
-from youtube_analyzer import YouTubeAnalyzer
+from youtube_analyzer import YouTubeAnalyzer, read_snapshot_published_at, READ_SNAPSHOT_ENABLED, DASHBOARD_PATH
+import analysis_jobs
+import profiling
 from datetime import datetime
 
 load_dotenv()
@@ -28,14 +31,70 @@ def run_initial_analysis():
 # 代わりにスケジューラーで定期実行
 # threading.Thread(target=run_initial_analysis, daemon=True).start()
 
+@app.before_request
+def start_request_profiling():
+    if not profiling.SQL_TIMING_ENABLED:
+        return
+    g.request_started = time.perf_counter()
+    profiling.reset_sql_stats()
+    g.profiler = profiling.start_request_profile(request.headers)
+
+@app.after_request
+def finish_request_profiling(response):
+    if not profiling.SQL_TIMING_ENABLED or 'request_started' not in g:
+        return response
+    
+    elapsed = time.perf_counter() - g.request_started
+    profiler = g.pop('profiler', None)
+    if profiler:
+        response.headers['X-Profile-File'] = profiling.finish_request_profile(profiler, request.method, request.path, elapsed)
+    
+    # SQLとそれ以外（行の整形・JSON化など）の内訳をブラウザの開発者ツールで確認できるようにする
+    sql_seconds, queries = profiling.get_sql_stats()
+    response.headers['Server-Timing'] = (
+        f'sql;dur={sql_seconds * 1000:.1f};desc="{queries} queries", '
+        f'app;dur={(elapsed - sql_seconds) * 1000:.1f}, total;dur={elapsed * 1000:.1f}'
+    )
+    return response
+
+def get_chart_filters():
+    # ?from=YYYY-MM&to=YYYY-MM&video_ids=id1,id2 で期間・動画を絞り込む
+    video_ids = request.args.get('video_ids')
+    return {
+        'month_from': request.args.get('from'),
+        'month_to': request.args.get('to'),
+        'video_ids': [v for v in video_ids.split(',') if v] if video_ids else None
+    }
+
+def get_last_updated_time():
+    # スケジューラーなど別プロセスの分析も反映されるよう、公開済みスナップショットの日時を優先
+    try:
+        return read_snapshot_published_at() or last_updated
+    except Exception as e:
+        print(f"最終更新日時の取得でエラー: {str(e)}")
+        return last_updated
+
 @app.route('/')
 def index():
-    # 起動時にランキングとチャートデータを自動読み込み
+    # 表示するデータはページ読み込み後に /dashboard からまとめて取得する
     return render_template('index.html', last_updated=last_updated)
 
+@app.route('/dashboard')
+def get_dashboard():
+    try:
+        # 取り込みの最後に書き出された初期表示用データを、そのまま返す（ファイルの読み込み1回）
+        if READ_SNAPSHOT_ENABLED and os.path.exists(DASHBOARD_PATH):
+            return send_file(os.path.abspath(DASHBOARD_PATH), mimetype='application/json', max_age=0)
+        
+        analyzer = YouTubeAnalyzer()
+        return jsonify(analyzer.build_dashboard())
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/last_updated')
 def get_last_updated():
-    return jsonify({'last_updated': last_updated})
+    return jsonify({'last_updated': get_last_updated_time()})
 
 @app.route('/analyze', methods=['POST'])
 def analyze_video():
@@ -46,8 +105,14 @@ def analyze_video():
         if not video_url:
             return jsonify({'error': 'Video URL is required'}), 400
         
+        if data.get('async'):
+            # バックグラウンドで分析し、進捗は /analysis_progress/<job_id> で配信
+            job_id = analysis_jobs.start_job('video', {'video_url': video_url, 'force': bool(data.get('force'))})
+            return jsonify({'job_id': job_id, 'status': 'running'}), 202
+        
         analyzer = YouTubeAnalyzer()
-        result = analyzer.analyze_video(video_url)
+        # TTL以内に分析済みならDBの結果を返す（force=trueで再分析）
+        result = analyzer.analyze_video_cached(video_url, force=bool(data.get('force')))
         
         return jsonify(result)
     
@@ -58,9 +123,11 @@ def analyze_video():
 def get_rankings():
     try:
         analyzer = YouTubeAnalyzer()
-        rankings = analyzer.get_monthly_rankings()
+        rankings = analyzer.get_monthly_rankings(**get_chart_filters())
         return jsonify(rankings)
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -74,36 +141,145 @@ def get_view_trends():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/trending')
+def get_trending():
+    try:
+        # ?sort=acceleration|views_per_day|likes_per_day|comments_per_day&limit=20
+        analyzer = YouTubeAnalyzer()
+        trending = analyzer.get_trending(
+            sort=request.args.get('sort', 'acceleration'),
+            limit=request.args.get('limit', 20, type=int)
+        )
+        return jsonify(trending)
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/monthly_comments_chart')
 def get_monthly_comments_chart():
     try:
         analyzer = YouTubeAnalyzer()
-        chart_data = analyzer.get_monthly_comments_chart_data()
+        chart_data = analyzer.get_monthly_comments_chart_data(**get_chart_filters())
         return jsonify(chart_data)
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/monthly_views_chart')
 def get_monthly_views_chart():
     try:
+        # ?resolution=day で日別（統計の更新で記録された日ごとの最新スナップショット）
+        resolution = request.args.get('resolution', 'month')
         analyzer = YouTubeAnalyzer()
-        chart_data = analyzer.get_monthly_views_chart_data()
+        if resolution == 'day':
+            chart_data = analyzer.get_daily_views_chart_data(**get_chart_filters())
+        elif resolution == 'month':
+            chart_data = analyzer.get_monthly_views_chart_data(**get_chart_filters())
+        else:
+            raise ValueError('resolutionは month または day を指定してください')
         return jsonify(chart_data)
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/representative_comments')
+def get_representative_comments():
+    try:
+        # ?video_ids=id1,id2&limit=5（video_ids未指定なら全動画）
+        video_ids = request.args.get('video_ids')
+        analyzer = YouTubeAnalyzer()
+        result = analyzer.get_representative_comments_bulk(
+            video_ids=[v for v in video_ids.split(',') if v] if video_ids else None,
+            limit=request.args.get('limit', type=int)
+        )
+        return jsonify(result)
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/search_comments')
+def search_comments():
+    try:
+        query = request.args.get('q', '').strip()
+        
+        if not query:
+            return jsonify({'error': 'Search query is required'}), 400
+        
+        analyzer = YouTubeAnalyzer()
+        result = analyzer.search_comments(
+            query,
+            video_id=request.args.get('video_id'),
+            sentiment=request.args.get('sentiment'),
+            date_from=request.args.get('date_from'),
+            date_to=request.args.get('date_to'),
+            sort=request.args.get('sort', 'relevance'),
+            page=request.args.get('page', 1, type=int),
+            per_page=request.args.get('per_page', 20, type=int)
+        )
+        
+        return jsonify(result)
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/analyze_csv', methods=['POST'])
 def analyze_csv():
     try:
+        # 一括分析はバックグラウンドで実行し、進捗は /analysis_progress/<job_id> で配信
+        job_id = analysis_jobs.start_job('csv')
+        return jsonify({'job_id': job_id, 'status': 'running'}), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/discover_videos', methods=['POST'])
+def discover_videos():
+    try:
+        # 設定されたチャンネル・再生リストから未登録の動画を探す（分析は行わない）
         analyzer = YouTubeAnalyzer()
-        result = analyzer.analyze_csv_urls()
+        result = analyzer.discover_videos()
         return jsonify(result)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/analysis_progress/<job_id>')
+def analysis_progress(job_id):
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id') or 0
+    try:
+        last_event_id = int(last_event_id)
+    except ValueError:
+        last_event_id = 0
+    
+    return Response(
+        stream_with_context(analysis_jobs.stream_events(job_id, last_event_id)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/analysis_jobs/<job_id>')
+def get_analysis_job(job_id):
+    try:
+        job = analysis_jobs.get_job(job_id)
+        
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify(job)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/database_management')
 def get_database_videos():
     try:
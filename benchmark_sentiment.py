@@ -0,0 +1,83 @@
+import os
+import sys
+import time
+import json
+import argparse
+from collections import Counter
+
+from youtube_analyzer import SENTIMENT_LABELS, connect_database, decode_comment_text
+from sentiment import BACKENDS, get_backend
+
+LABELS = ['positive', 'neutral', 'negative']
+
+def load_comments(db_path, limit):
+    with connect_database(db_path) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT text, sentiment
+            FROM comments
+            ORDER BY RANDOM()
+            LIMIT ?
+        ''', (limit,))
+        return [(decode_comment_text(text), SENTIMENT_LABELS[code]) for text, code in cursor.fetchall()]
+
+def run_backend(backend, texts):
+    start = time.perf_counter()
+    labels = [backend.analyze(text)[1] for text in texts]
+    elapsed = time.perf_counter() - start
+    return labels, elapsed
+
+def agreement(labels, reference):
+    matches = sum(1 for a, b in zip(labels, reference) if a == b)
+    confusion = Counter(zip(reference, labels))
+    return {
+        'rate': round(matches / len(reference), 4) if reference else None,
+        # confusion[基準ラベル][バックエンドのラベル] = 件数
+        'confusion': {ref: {label: confusion[(ref, label)] for label in LABELS} for ref in LABELS}
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='感情分析バックエンドの処理速度と、保存済みラベルとの一致率を計測します')
+    parser.add_argument('--db', default='youtube_analysis.db', help='コメントを読み込むデータベースファイル')
+    parser.add_argument('--limit', type=int, default=20000, help='計測に使うコメント数（ランダム抽出）')
+    parser.add_argument('--backends', default=','.join(BACKENDS), help='計測するバックエンド（カンマ区切り）')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"データベースが見つかりません: {args.db}")
+        sys.exit(1)
+
+    comments = load_comments(args.db, args.limit)
+    if not comments:
+        print("コメントデータがありません。動画を分析してください。")
+        sys.exit(1)
+
+    texts = [text for text, _ in comments]
+    stored = [label for _, label in comments]
+
+    results = {}
+    labels_by_backend = {}
+    for name in args.backends.split(','):
+        labels, elapsed = run_backend(get_backend(name), texts)
+        labels_by_backend[name] = labels
+        results[name] = {
+            'comments_per_sec': round(len(texts) / elapsed, 1),
+            'total_seconds': round(elapsed, 3),
+            'label_distribution': dict(Counter(labels)),
+            'agreement_with_stored': agreement(labels, stored)
+        }
+
+    # 保存済みラベルは分析時点の辞書・本文形式に依存するため、現在の従来方式との一致率も出す
+    if 'textblob' in labels_by_backend:
+        for name, result in results.items():
+            if name != 'textblob':
+                result['agreement_with_textblob'] = agreement(labels_by_backend[name], labels_by_backend['textblob'])
+
+    print(json.dumps({
+        'comments': len(texts),
+        'stored_label_distribution': dict(Counter(stored)),
+        'backends': results
+    }, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,335 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import subprocess
+import threading
+import multiprocessing
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+from collections import defaultdict
+
+import requests
+
+# ダッシュボードが読み込むエンドポイント
+ENDPOINTS = ['/', '/dashboard', '/rankings', '/view_trends', '/monthly_comments_chart', '/monthly_views_chart', '/database_management']
+
+SAMPLE_TEXTS = [
+    '最高の曲！何回も聴いてます', 'MVかわいすぎる', 'センターの表情が好き', 'この曲はちょっと微妙かな',
+    'ダンスがかっこいい', '歌詞が刺さる', 'つまらない', '推しが尊い', 'love this song', 'ライブで聴きたい',
+    '残念な編集', '神曲すぎる', '中毒になる', '普通', 'ありがとう', '鳥肌が立った'
+]
+
+def load_modules(db_path):
+    # DB_PATH はインポート時に読み込まれるため、環境変数を設定してからインポートする
+    os.environ['DB_PATH'] = db_path
+    os.environ.setdefault('YOUTUBE_API_KEY', 'load-test')
+    import youtube_analyzer
+    return youtube_analyzer
+
+def synthetic_video(rng, index):
+    published = datetime(2022, 1, 1) + timedelta(days=rng.randint(0, 900))
+    return {
+        'id': f'load{index:07d}',
+        'title': f'負荷試験 {index}',
+        'view_count': rng.randint(10 ** 4, 10 ** 7),
+        'like_count': rng.randint(100, 10 ** 5),
+        'comment_count': rng.randint(100, 10 ** 4),
+        'published_at': published.strftime('%Y-%m-%dT%H:%M:%SZ')
+    }
+
+def synthetic_comments(analyzer, rng, video_id, count, start=0):
+    comments = []
+    for k in range(start, start + count):
+        text = rng.choice(SAMPLE_TEXTS) + '!' * rng.randint(0, 3)
+        published = datetime(2022, 1, 1) + timedelta(minutes=rng.randint(0, 60 * 24 * 1000))
+        sentiment_score, sentiment_label = analyzer.analyze_sentiment(text)
+        comments.append({
+            'id': f'{video_id}_{k}',
+            'text': text,
+            'like_count': rng.randint(0, 500),
+            'published_at': published.strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'sentiment_score': sentiment_score,
+            'sentiment_label': sentiment_label
+        })
+    return comments
+
+def seed_database(db_path, videos, comments_per_video, snapshot_days, seed):
+    """同じシードなら同じ内容になる試験用DBを、通常の保存処理で作成する"""
+    ya = load_modules(db_path)
+    rng = random.Random(seed)
+    analyzer = ya.YouTubeAnalyzer()
+
+    for index in range(videos):
+        video_info = synthetic_video(rng, index)
+        analyzer.save_video_data(video_info, synthetic_comments(analyzer, rng, video_info['id'], comments_per_video))
+
+    # 過去の再生数スナップショット（1日1回）
+    with analyzer.get_db_connection() as conn:
+        cursor = conn.cursor()
+        now = datetime.now()
+        for index in range(videos):
+            video_id = f'load{index:07d}'
+            view_count = rng.randint(10 ** 3, 10 ** 5)
+            for day in range(snapshot_days, 0, -1):
+                view_count += rng.randint(0, 5000)
+                cursor.execute('''
+                    INSERT INTO view_snapshots (video_id, view_count, like_count, comment_count, snapshot_date)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (video_id, view_count, view_count // 100, view_count // 1000,
+                      (now - timedelta(days=day)).strftime('%Y-%m-%d %H:%M:%S')))
+        ya.rebuild_growth_metrics(cursor)
+        ya.record_analytics_change(cursor, None)
+        conn.commit()
+
+    analyzer.publish_read_snapshot()
+
+def run_ingest(db_path, stop, results, seed, batch_comments, pause, snapshot_every):
+    """スケジューラーの取り込みを模して、コメントの保存とスナップショット公開を繰り返す（別プロセス）"""
+    sys.stdout = sys.stderr
+    ya = load_modules(db_path)
+    rng = random.Random(seed + 1)
+    analyzer = ya.YouTubeAnalyzer()
+
+    with analyzer.get_db_connection() as conn:
+        video_ids = [row[0] for row in conn.execute('SELECT id FROM videos')]
+
+    batches = 0
+    lock_waits = []
+    start = time.perf_counter()
+    while not stop.is_set():
+        video_id = rng.choice(video_ids)
+
+        # 書き込みロックの取得にかかった時間（保存の直前に計測）
+        conn = ya.connect_database(db_path)
+        wait_start = time.perf_counter()
+        conn.execute('BEGIN IMMEDIATE')
+        lock_waits.append(time.perf_counter() - wait_start)
+        conn.rollback()
+        conn.close()
+
+        video_info = synthetic_video(rng, int(video_id[4:]))
+        comments = synthetic_comments(analyzer, rng, video_id, batch_comments, start=10 ** 6 + batches * batch_comments)
+        analyzer.save_video_data(video_info, comments)
+        batches += 1
+
+        if snapshot_every and batches % snapshot_every == 0:
+            analyzer.publish_read_snapshot()
+        time.sleep(pause)
+
+    elapsed = time.perf_counter() - start
+    results.put({
+        'batches': batches,
+        'comments_written': batches * batch_comments,
+        'batches_per_sec': round(batches / elapsed, 2) if elapsed else None,
+        'lock_waits': sum(1 for wait in lock_waits if wait >= 0.005),
+        'lock_wait_ms': latency_summary(lock_waits)
+    })
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return None
+    # 最近順位法
+    index = min(len(sorted_values) - 1, max(0, math.ceil(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def latency_summary(latencies):
+    values = sorted(latencies)
+    return {
+        name: round(percentile(values, p) * 1000, 2) if values else None
+        for name, p in (('p50', 50), ('p95', 95), ('p99', 99), ('max', 100))
+    }
+
+def run_load(base_url, endpoints, concurrency, duration):
+    latencies = defaultdict(list)
+    errors = defaultdict(int)
+    lock_errors = defaultdict(int)
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def worker(offset):
+        session = requests.Session()
+        i = offset
+        while time.monotonic() < deadline:
+            path = endpoints[i % len(endpoints)]
+            i += 1
+            start = time.perf_counter()
+            try:
+                response = session.get(base_url + path, timeout=60)
+                elapsed = time.perf_counter() - start
+                failed = response.status_code >= 400
+                locked = failed and 'locked' in response.text
+            except requests.RequestException:
+                elapsed = time.perf_counter() - start
+                failed, locked = True, False
+
+            with lock:
+                latencies[path].append(elapsed)
+                if failed:
+                    errors[path] += 1
+                if locked:
+                    lock_errors[path] += 1
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    all_latencies = [value for values in latencies.values() for value in values]
+    return {
+        'requests': len(all_latencies),
+        'errors': sum(errors.values()),
+        'lock_errors': sum(lock_errors.values()),
+        'throughput_rps': round(len(all_latencies) / elapsed, 1),
+        'latency_ms': latency_summary(all_latencies),
+        'endpoints': {
+            path: {
+                'requests': len(latencies[path]),
+                'errors': errors[path],
+                'lock_errors': lock_errors[path],
+                'latency_ms': latency_summary(latencies[path])
+            } for path in endpoints
+        }
+    }
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+def start_server(db_path, workers, threads, read_snapshot):
+    port = free_port()
+    env = dict(os.environ, DB_PATH=db_path, READ_SNAPSHOT='1' if read_snapshot else '0')
+    env.setdefault('YOUTUBE_API_KEY', 'load-test')
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--bind', f'127.0.0.1:{port}',
+         '--workers', str(workers), '--threads', str(threads), 'app:app'],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(base_url + '/last_updated', timeout=1).ok:
+                return process, base_url
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+
+    process.terminate()
+    raise RuntimeError('gunicornが起動しませんでした')
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description='ダッシュボードのエンドポイントに並列でリクエストを送り、レイテンシとスループットを計測します')
+    parser.add_argument('--db', default='load_test.db', help='試験用データベースファイル（無ければ作成）')
+    parser.add_argument('--reseed', action='store_true', help='試験用データベースを作り直す')
+    parser.add_argument('--seed', type=int, default=42, help='試験データの乱数シード')
+    parser.add_argument('--videos', type=int, default=40, help='試験データの動画数')
+    parser.add_argument('--comments', type=int, default=2000, help='動画あたりのコメント数')
+    parser.add_argument('--snapshot-days', type=int, default=90, help='動画あたりの再生数スナップショットの日数')
+    parser.add_argument('--url', help='起動済みサーバーのURL（指定しない場合はgunicornを起動）')
+    parser.add_argument('--workers', type=int, default=2, help='gunicornのワーカー数')
+    parser.add_argument('--threads', type=int, default=4, help='gunicornのワーカーあたりのスレッド数')
+    parser.add_argument('--no-read-snapshot', action='store_true', help='読み取り用スナップショットを使わずに本DBを読む')
+    parser.add_argument('--concurrency', type=int, default=8, help='同時に送るリクエスト数')
+    parser.add_argument('--duration', type=float, default=30, help='計測時間（秒）')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='対象エンドポイント（カンマ区切り）')
+    parser.add_argument('--ingest', action='store_true', help='計測中に別プロセスでコメントの取り込みを続ける')
+    parser.add_argument('--ingest-batch', type=int, default=500, help='取り込み1回あたりのコメント数')
+    parser.add_argument('--ingest-pause', type=float, default=0.0, help='取り込みの間隔（秒）')
+    parser.add_argument('--ingest-snapshot-every', type=int, default=10, help='この回数の取り込みごとにスナップショットを公開（0で公開しない）')
+    parser.add_argument('--output', help='結果のJSONを書き出すファイル')
+    args = parser.parse_args()
+
+    db_path = os.path.abspath(args.db)
+    if args.reseed:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(db_path + suffix):
+                os.remove(db_path + suffix)
+    if not os.path.exists(db_path):
+        print(f"試験用データベースを作成しています: {db_path}", file=sys.stderr)
+        # 結果のJSONだけを標準出力に出すため、分析処理のログは標準エラーへ
+        with redirect_stdout(sys.stderr):
+            seed_database(db_path, args.videos, args.comments, args.snapshot_days, args.seed)
+
+    process = None
+    if args.url:
+        base_url = args.url.rstrip('/')
+    else:
+        process, base_url = start_server(db_path, args.workers, args.threads, not args.no_read_snapshot)
+
+    endpoints = [e for e in args.endpoints.split(',') if e]
+    ingest = None
+    try:
+        # 初回読み込み（キューブの構築など）を計測から除く
+        for path in endpoints:
+            requests.get(base_url + path, timeout=120)
+
+        if args.ingest:
+            stop = multiprocessing.Event()
+            results = multiprocessing.Queue()
+            ingest = multiprocessing.Process(
+                target=run_ingest,
+                args=(db_path, stop, results, args.seed, args.ingest_batch, args.ingest_pause, args.ingest_snapshot_every)
+            )
+            ingest.start()
+
+        load = run_load(base_url, endpoints, args.concurrency, args.duration)
+
+        ingest_result = None
+        if ingest:
+            stop.set()
+            ingest_result = results.get(timeout=120)
+            ingest.join()
+    finally:
+        if ingest and ingest.is_alive():
+            ingest.terminate()
+        if process:
+            process.terminate()
+            process.wait()
+
+    report = {
+        'commit': git_commit(),
+        'config': {
+            'db': db_path,
+            'url': args.url,
+            'workers': None if args.url else args.workers,
+            'threads': None if args.url else args.threads,
+            'read_snapshot': not args.no_read_snapshot,
+            'concurrency': args.concurrency,
+            'duration': args.duration,
+            'ingest': args.ingest,
+            'ingest_batch': args.ingest_batch if args.ingest else None
+        },
+        'load': load,
+        'ingest': ingest_result
+    }
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+    print(output)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+import os
+import sys
+import time
+import json
+import sqlite3
+import argparse
+
+from youtube_analyzer import SCHEMA_VERSION, connect_database, migrate_schema_v2
+
+# 移行前後で同じ結果を返す代表的なクエリ（v1 / v2 スキーマそれぞれの書き方）
+BENCHMARK_QUERIES = {
+    'monthly_aggregation': {
+        1: '''
+            SELECT video_id, strftime('%Y-%m', published_at), COUNT(*),
+                   SUM(CASE WHEN sentiment_label = 'positive' THEN 1 ELSE 0 END),
+                   SUM(CASE WHEN sentiment_label = 'negative' THEN 1 ELSE 0 END),
+                   AVG(sentiment_score)
+            FROM comments
+            GROUP BY video_id, strftime('%Y-%m', published_at)
+        ''',
+        2: '''
+            SELECT video_id, month_key, COUNT(*),
+                   SUM(sentiment = 1),
+                   SUM(sentiment = -1),
+                   AVG(sentiment_score)
+            FROM comments
+            GROUP BY video_id, month_key
+        '''
+    },
+    'monthly_comments_chart': {
+        1: '''
+            SELECT v.title, v.id, v.published_at, c.published_at, COUNT(*)
+            FROM videos v
+            JOIN comments c ON v.id = c.video_id
+            GROUP BY v.id, v.title, v.published_at, strftime('%Y-%m', c.published_at)
+            ORDER BY v.published_at, c.published_at
+        ''',
+        2: '''
+            SELECT v.title, v.id, v.published_at, c.month_key, COUNT(*)
+            FROM videos v
+            JOIN comments c ON v.id = c.video_id
+            GROUP BY v.id, c.month_key
+            ORDER BY v.published_at, c.month_key
+        '''
+    },
+    'sentiment_counts': {
+        1: 'SELECT sentiment_label, COUNT(*) FROM comments GROUP BY sentiment_label',
+        2: 'SELECT sentiment, COUNT(*) FROM comments GROUP BY sentiment'
+    },
+    'rankings': {
+        1: '''
+            SELECT v.title, ms.month, ms.negative_comments
+            FROM monthly_stats ms JOIN videos v ON ms.video_id = v.id
+            ORDER BY ms.negative_comments DESC LIMIT 10
+        ''',
+        2: '''
+            SELECT v.title, ms.month_key, ms.negative_comments
+            FROM monthly_stats ms JOIN videos v ON ms.video_id = v.id
+            ORDER BY ms.negative_comments DESC LIMIT 10
+        '''
+    }
+}
+
+def database_size(conn, db_path):
+    conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    return os.path.getsize(db_path)
+
+def object_sizes(conn):
+    """dbstatで表・索引・全文検索インデックスごとの使用バイト数を返す
+
+    ファイル全体にはv2で追加した索引や全文検索インデックスも含まれるため、
+    コンパクト化の効果は comments 表だけの大きさで比べる。
+    """
+    try:
+        pages = conn.execute('SELECT name, SUM(pgsize) FROM dbstat GROUP BY name').fetchall()
+    except sqlite3.OperationalError:
+        # dbstat を含まないSQLiteではファイルサイズのみ
+        return None
+
+    indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    sizes = {'comments_table_bytes': 0, 'index_bytes': {}, 'fts_bytes': 0, 'other_table_bytes': 0}
+    for name, size in pages:
+        if name == 'comments':
+            sizes['comments_table_bytes'] = size
+        elif name in indexes:
+            sizes['index_bytes'][name] = size
+        elif name.startswith('comments_fts'):
+            sizes['fts_bytes'] += size
+        else:
+            sizes['other_table_bytes'] += size
+    sizes['index_bytes'] = dict(sorted(sizes['index_bytes'].items(), key=lambda item: -item[1]))
+    return sizes
+
+def measure(conn, db_path, version, repeat):
+    timings = {}
+    for name, queries in BENCHMARK_QUERIES.items():
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(queries[version]).fetchall()
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = round(best * 1000, 2)
+
+    return {
+        'schema_version': version,
+        'file_size_bytes': database_size(conn, db_path),
+        'sizes': object_sizes(conn),
+        'comment_rows': conn.execute('SELECT COUNT(*) FROM comments').fetchone()[0],
+        'query_ms': timings
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='youtube_analysis.db をスキーマv2へ移行し、移行前後のサイズとクエリ時間を計測します')
+    parser.add_argument('--db', default='youtube_analysis.db', help='移行するデータベースファイル')
+    parser.add_argument('--no-backup', action='store_true', help='移行前のバックアップを作成しない')
+    parser.add_argument('--repeat', type=int, default=3, help='各クエリの計測回数（最良値を採用）')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"データベースが見つかりません: {args.db}")
+        sys.exit(1)
+
+    conn = connect_database(args.db)
+    version = conn.execute('PRAGMA user_version').fetchone()[0]
+    if version >= SCHEMA_VERSION:
+        print(f"既にスキーマv{version}です。移行は不要です。")
+        return
+
+    if not args.no_backup:
+        backup_path = args.db + '.v1.bak'
+        with sqlite3.connect(backup_path) as backup:
+            conn.backup(backup)
+        backup.close()
+        print(f"バックアップを作成しました: {backup_path}")
+
+    before = measure(conn, args.db, 1, args.repeat)
+
+    start = time.perf_counter()
+    with conn:
+        migrate_schema_v2(conn)
+    conn.execute('VACUUM')
+    migration_seconds = time.perf_counter() - start
+
+    after = measure(conn, args.db, SCHEMA_VERSION, args.repeat)
+    conn.close()
+
+    report = {
+        'before': before,
+        'after': after,
+        'migration_seconds': round(migration_seconds, 2),
+        # ファイル全体（v2で追加した索引・全文検索インデックスを含む）
+        'file_size_ratio': round(after['file_size_bytes'] / before['file_size_bytes'], 3)
+    }
+    if before['sizes'] and after['sizes']:
+        report['comments_table_ratio'] = round(
+            after['sizes']['comments_table_bytes'] / max(before['sizes']['comments_table_bytes'], 1), 3
+        )
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
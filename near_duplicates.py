@@ -0,0 +1,88 @@
+import os
+import re
+import zlib
+import unicodedata
+
+import numpy as np
+
+# 推定Jaccard類似度がこの値以上のコメントを近似重複として同じクラスターにまとめる
+NEAR_DUPLICATE_THRESHOLD = float(os.environ.get('NEAR_DUPLICATE_THRESHOLD', 0.8))
+
+# 文字n-gram（日本語は空白で区切られないため文字単位）
+SHINGLE_SIZE = 3
+
+# MinHashの置換数と、LSHの帯の数（1帯あたり NUM_PERM // LSH_BANDS 行）
+# 16帯 × 4行では類似度0.5前後から候補になり、0.8以上の組はほぼ確実に候補になる
+NUM_PERM = 64
+LSH_BANDS = 16
+
+# ハッシュ (a * x + b) mod p の係数（プロセス間で同じ結果になるよう固定シード）
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240101)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.int64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.int64)
+
+WHITESPACE_PATTERN = re.compile(r'\s+')
+# 「wwwwww」「！！！！」のような連続を2文字に揃える
+REPEAT_PATTERN = re.compile(r'(.)\1{2,}')
+
+def normalize_text(text):
+    text = unicodedata.normalize('NFKC', text or '').lower()
+    text = WHITESPACE_PATTERN.sub('', text)
+    return REPEAT_PATTERN.sub(r'\1\1', text)
+
+def shingles(text):
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {text[i:i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)}
+
+def minhash_signature(text):
+    hashes = np.fromiter(
+        (zlib.crc32(s.encode('utf-8')) % _PRIME for s in shingles(text)),
+        dtype=np.int64
+    )
+    # a, x < 2^31 なので積は int64 に収まる
+    return ((np.outer(_A, hashes) + _B[:, None]) % _PRIME).min(axis=1)
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+def cluster_near_duplicates(texts, threshold=NEAR_DUPLICATE_THRESHOLD):
+    """テキストを近似重複ごとにまとめ、クラスター（元の添字のリスト）のリストを返す
+
+    正規化後に同一のテキストはMinHashを計算せずにまとめる。残りはLSHで同じバケットに入った組だけを
+    署名の一致率（推定Jaccard類似度）で確認するので、全組み合わせの比較は行わない。
+    """
+    groups = {}
+    for index, text in enumerate(texts):
+        groups.setdefault(normalize_text(text), []).append(index)
+
+    keys = list(groups)
+    parent = list(range(len(keys)))
+
+    if len(keys) > 1:
+        signatures = np.vstack([minhash_signature(key) for key in keys])
+        rows = NUM_PERM // LSH_BANDS
+
+        for band in range(LSH_BANDS):
+            buckets = {}
+            for i, band_signature in enumerate(signatures[:, band * rows:(band + 1) * rows]):
+                buckets.setdefault(band_signature.tobytes(), []).append(i)
+
+            # バケット内は先頭の要素とだけ比較する（推移的にまとまるので十分）
+            for members in buckets.values():
+                head = members[0]
+                for other in members[1:]:
+                    root_head, root_other = _find(parent, head), _find(parent, other)
+                    if root_head == root_other:
+                        continue
+                    if np.mean(signatures[head] == signatures[other]) >= threshold:
+                        parent[root_other] = root_head
+
+    clusters = {}
+    for i, key in enumerate(keys):
+        clusters.setdefault(_find(parent, i), []).extend(groups[key])
+    return [sorted(members) for members in clusters.values()]
@@ -0,0 +1,259 @@
+import os
+import sys
+import glob
+import json
+import argparse
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from youtube_analyzer import (
+    DB_PATH, READ_SNAPSHOT_ENABLED, READ_SNAPSHOT_PATH,
+    connect_database, connect_read_snapshot, iso_to_month_key
+)
+
+# 月・動画ごとに分割したParquetアーカイブの保存先（既定はDBと同じディレクトリの archive/）
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR') or os.path.join(os.path.dirname(DB_PATH), 'archive')
+
+# archive/<table>/month_key=YYYYMM/video_id=<ID>/*.parquet
+PARTITIONING = ds.partitioning(
+    pa.schema([('month_key', pa.int32()), ('video_id', pa.string())]),
+    flavor='hive'
+)
+
+SCHEMAS = {
+    'comments': pa.schema([
+        ('id', pa.string()),
+        ('text', pa.string()),
+        ('sentiment_score', pa.float64()),
+        ('sentiment', pa.int8()),
+        ('published_at', pa.int64()),
+        ('like_count', pa.int32()),
+        # 近似重複クラスターの件数（代表自身を含む。この列がない古いファイルは null として読まれる）
+        ('duplicate_count', pa.int32())
+    ]),
+    # 代表以外のクラスターのメンバー（感情は representative_id のコメントのもの）
+    'comment_duplicates': pa.schema([
+        ('id', pa.string()),
+        ('representative_id', pa.string()),
+        ('published_at', pa.int64()),
+        ('like_count', pa.int32())
+    ]),
+    'view_snapshots': pa.schema([
+        ('id', pa.int64()),
+        ('view_count', pa.int64()),
+        ('like_count', pa.int64()),
+        ('comment_count', pa.int64()),
+        ('snapshot_date', pa.string())
+    ])
+}
+
+STATE_FILE = '_state.json'
+
+def partition_dir(archive_dir, table, month_key, video_id):
+    return os.path.join(archive_dir, table, f'month_key={month_key}', f'video_id={video_id}')
+
+def write_partition(archive_dir, table, month_key, video_id, filename, rows):
+    directory = partition_dir(archive_dir, table, month_key, video_id)
+    os.makedirs(directory, exist_ok=True)
+
+    schema = SCHEMAS[table]
+    columns = list(zip(*rows))
+    arrays = [pa.array(column, type=field.type) for column, field in zip(columns, schema)]
+
+    # 読み取り中のクエリが書きかけのファイルを読まないよう、一時ファイル（"."始まりは無視される）から置き換える
+    tmp_path = os.path.join(directory, f'.{filename}.tmp')
+    pq.write_table(pa.Table.from_arrays(arrays, schema=schema), tmp_path, compression='zstd')
+    os.replace(tmp_path, os.path.join(directory, filename))
+
+def remove_stale_partitions(archive_dir, table, video_id, month_keys, filename):
+    # 今回書き出さなかった月のファイル（再分析で行がなくなった月）を消す
+    pattern = os.path.join(archive_dir, table, 'month_key=*', f'video_id={video_id}', filename)
+    for path in glob.glob(pattern):
+        month_key = int(os.path.basename(os.path.dirname(os.path.dirname(path))).split('=', 1)[1])
+        if month_key not in month_keys:
+            os.remove(path)
+
+def load_state(archive_dir):
+    path = os.path.join(archive_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {'view_snapshots_last_id': 0, 'comment_signatures': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_state(archive_dir, state):
+    path = os.path.join(archive_dir, STATE_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+def open_source_database(db_path):
+    # 取り込み中の本DBと競合しないよう、公開済みの読み取り用スナップショットがあればそちらから読む
+    if db_path == DB_PATH and READ_SNAPSHOT_ENABLED and os.path.exists(READ_SNAPSHOT_PATH):
+        return connect_read_snapshot(READ_SNAPSHOT_PATH)
+    return connect_database(db_path)
+
+def archive_comments(cursor, archive_dir, state):
+    # 動画ごとの (件数, 最大rowid, 重複メンバー数) が前回から変わった動画だけを書き直す
+    # （再分析では INSERT OR REPLACE で全コメントが新しいrowidになる）
+    cursor.execute('''
+        SELECT
+            c.video_id,
+            COUNT(*),
+            MAX(c.rowid),
+            (SELECT COUNT(*) FROM comment_duplicates d WHERE d.video_id = c.video_id)
+        FROM comments c
+        GROUP BY c.video_id
+    ''')
+    signatures = {video_id: [count, max_rowid, duplicates] for video_id, count, max_rowid, duplicates in cursor.fetchall()}
+    previous = state['comment_signatures']
+
+    changed = [video_id for video_id, signature in signatures.items() if previous.get(video_id) != signature]
+    partitions = 0
+    rows_written = 0
+
+    for video_id in changed:
+        cursor.execute('''
+            SELECT month_key, id, decompress_text(text), sentiment_score, sentiment, published_at, like_count, duplicate_count
+            FROM comments
+            WHERE video_id = ?
+            ORDER BY month_key, published_at
+        ''', (video_id,))
+        comments_by_month = {}
+        for row in cursor.fetchall():
+            comments_by_month.setdefault(row[0], []).append(row[1:])
+
+        cursor.execute('''
+            SELECT month_key, id, representative_id, published_at, like_count
+            FROM comment_duplicates
+            WHERE video_id = ?
+            ORDER BY month_key, published_at
+        ''', (video_id,))
+        duplicates_by_month = {}
+        for row in cursor.fetchall():
+            duplicates_by_month.setdefault(row[0], []).append(row[1:])
+
+        # 同じ月・動画の行は1ファイルにまとめて置き換える（アーカイブから動画を削除することはしない）
+        for table, filename, by_month in [
+            ('comments', 'comments.parquet', comments_by_month),
+            ('comment_duplicates', 'comment_duplicates.parquet', duplicates_by_month)
+        ]:
+            for month_key, rows in by_month.items():
+                write_partition(archive_dir, table, month_key, video_id, filename, rows)
+                partitions += 1
+                rows_written += len(rows)
+            remove_stale_partitions(archive_dir, table, video_id, set(by_month), filename)
+
+        previous[video_id] = signatures[video_id]
+
+    return {'videos': len(changed), 'partitions': partitions, 'rows': rows_written}
+
+def archive_view_snapshots(cursor, archive_dir, state):
+    # スナップショットは追記のみ（AUTOINCREMENTのidは再利用されない）なので、前回のid以降を追記する
+    last_id = state['view_snapshots_last_id']
+    cursor.execute('''
+        SELECT id, video_id, view_count, like_count, comment_count, snapshot_date
+        FROM view_snapshots
+        WHERE id > ?
+        ORDER BY id
+    ''', (last_id,))
+    rows = cursor.fetchall()
+    if not rows:
+        return {'partitions': 0, 'rows': 0}
+
+    by_partition = {}
+    for snapshot_id, video_id, view_count, like_count, comment_count, snapshot_date in rows:
+        key = (iso_to_month_key(snapshot_date), video_id)
+        by_partition.setdefault(key, []).append((snapshot_id, view_count, like_count, comment_count, snapshot_date))
+
+    for (month_key, video_id), partition_rows in by_partition.items():
+        filename = f'part-{partition_rows[0][0]:012d}.parquet'
+        write_partition(archive_dir, 'view_snapshots', month_key, video_id, filename, partition_rows)
+
+    state['view_snapshots_last_id'] = rows[-1][0]
+    return {'partitions': len(by_partition), 'rows': len(rows)}
+
+def export_archive(db_path=DB_PATH, archive_dir=ARCHIVE_DIR):
+    """前回のエクスポート以降に追加・更新されたコメントとスナップショットをParquetに書き出す"""
+    os.makedirs(archive_dir, exist_ok=True)
+    state = load_state(archive_dir)
+
+    conn = open_source_database(db_path)
+    try:
+        cursor = conn.cursor()
+        comments = archive_comments(cursor, archive_dir, state)
+        snapshots = archive_view_snapshots(cursor, archive_dir, state)
+    finally:
+        conn.close()
+
+    save_state(archive_dir, state)
+    return {'comments': comments, 'view_snapshots': snapshots}
+
+def query_archive(table, columns=None, video_ids=None, month_from=None, month_to=None, archive_dir=ARCHIVE_DIR):
+    """アーカイブから必要なパーティション・列だけを読み込み、pyarrow.Table で返す
+
+    month_from / month_to は YYYYMM。パーティション列（month_key, video_id）も columns に指定できる。
+    """
+    if table not in SCHEMAS:
+        raise ValueError(f"Unknown archive table: {table} (choose from {', '.join(SCHEMAS)})")
+
+    path = os.path.join(archive_dir, table)
+    schema = SCHEMAS[table].append(pa.field('month_key', pa.int32())).append(pa.field('video_id', pa.string()))
+    if not os.path.isdir(path):
+        return schema.empty_table() if columns is None else schema.empty_table().select(columns)
+
+    dataset = ds.dataset(path, format='parquet', partitioning=PARTITIONING, schema=schema)
+
+    # パーティション列の条件はディレクトリ単位で評価され、該当しないファイルは開かれない
+    conditions = []
+    if video_ids is not None:
+        conditions.append(ds.field('video_id').isin(list(video_ids)))
+    if month_from is not None:
+        conditions.append(ds.field('month_key') >= month_from)
+    if month_to is not None:
+        conditions.append(ds.field('month_key') <= month_to)
+
+    condition = None
+    for c in conditions:
+        condition = c if condition is None else condition & c
+
+    return dataset.to_table(columns=columns, filter=condition)
+
+def main():
+    parser = argparse.ArgumentParser(description='コメントと再生数スナップショットを月・動画ごとのParquetファイルにアーカイブします')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    export_parser = subparsers.add_parser('export', help='前回以降の差分をアーカイブに書き出す')
+    export_parser.add_argument('--db', default=DB_PATH, help='読み込むデータベースファイル')
+    export_parser.add_argument('--archive', default=ARCHIVE_DIR, help='アーカイブの保存先ディレクトリ')
+
+    query_parser = subparsers.add_parser('query', help='アーカイブを読み込み、月・動画ごとの行数を表示する')
+    query_parser.add_argument('table', choices=list(SCHEMAS))
+    query_parser.add_argument('--archive', default=ARCHIVE_DIR, help='アーカイブの保存先ディレクトリ')
+    query_parser.add_argument('--video-ids', help='対象の動画ID（カンマ区切り）')
+    query_parser.add_argument('--from', dest='month_from', help='開始月（YYYY-MM）')
+    query_parser.add_argument('--to', dest='month_to', help='終了月（YYYY-MM）')
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        if not os.path.exists(args.db):
+            print(f"データベースが見つかりません: {args.db}")
+            sys.exit(1)
+        print(json.dumps(export_archive(args.db, args.archive), ensure_ascii=False, indent=2))
+        return
+
+    table = query_archive(
+        args.table,
+        columns=['month_key', 'video_id'],
+        video_ids=args.video_ids.split(',') if args.video_ids else None,
+        month_from=iso_to_month_key(args.month_from) if args.month_from else None,
+        month_to=iso_to_month_key(args.month_to) if args.month_to else None,
+        archive_dir=args.archive
+    )
+    counts = table.group_by(['video_id', 'month_key']).aggregate([('video_id', 'count')])
+    print(json.dumps(sorted(counts.to_pylist(), key=lambda r: (r['video_id'], r['month_key'])), ensure_ascii=False, indent=2))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import os
+import re
+import json
+import time
+import cProfile
+import sqlite3
+import threading
+from datetime import datetime
+
+# この時間（ミリ秒）以上かかったSQLを SLOW_QUERY_LOG にJSON Linesで記録する（未設定なら記録しない）
+SLOW_QUERY_MS = float(os.environ['SLOW_QUERY_MS']) if os.environ.get('SLOW_QUERY_MS') else None
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', 'slow_queries.log')
+
+# リクエストごとのcProfile: '1' なら全リクエスト、'header' なら X-Profile: 1 ヘッダー付きのリクエストだけ
+PROFILE_REQUESTS = os.environ.get('PROFILE_REQUESTS', '')
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILE_HEADER = 'X-Profile'
+
+# SQLの計測を行うか（無効時は通常の接続を使い、オーバーヘッドを生じさせない）
+SQL_TIMING_ENABLED = SLOW_QUERY_MS is not None or bool(PROFILE_REQUESTS)
+
+_slow_log_lock = threading.Lock()
+_sql_stats = threading.local()
+
+def reset_sql_stats():
+    _sql_stats.seconds = 0.0
+    _sql_stats.queries = 0
+
+def get_sql_stats():
+    return getattr(_sql_stats, 'seconds', 0.0), getattr(_sql_stats, 'queries', 0)
+
+def log_slow_query(sql, seconds, rows):
+    entry = {
+        'at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'duration_ms': round(seconds * 1000, 2),
+        'rows': rows,
+        'sql': re.sub(r'\s+', ' ', sql).strip()[:2000]
+    }
+    with _slow_log_lock:
+        with open(SLOW_QUERY_LOG, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+
+class TimedCursor(sqlite3.Cursor):
+    """実行から結果の読み出しまでの時間と行数をSQLごとに計測するカーソル
+
+    SQLiteの set_trace_callback は文の開始しか通知しないため、実行（execute）と
+    読み出し（fetch*）にかかった時間をカーソル側で合計し、読み出しの完了時に記録する。
+    """
+
+    sql = None
+
+    def begin(self, sql):
+        self.finish()
+        self.sql = sql
+        self.seconds = 0.0
+        self.rows = 0
+
+    def timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def execute(self, sql, *args):
+        self.begin(sql)
+        self.timed(super().execute, sql, *args)
+        if self.description is None:
+            self.finish()
+        return self
+
+    def executemany(self, sql, *args):
+        self.begin(sql)
+        self.timed(super().executemany, sql, *args)
+        self.finish()
+        return self
+
+    def fetchone(self):
+        row = self.timed(super().fetchone)
+        if row is None:
+            self.finish()
+        else:
+            self.rows += 1
+        return row
+
+    def fetchmany(self, *args):
+        rows = self.timed(super().fetchmany, *args)
+        self.rows += len(rows)
+        if not rows:
+            self.finish()
+        return rows
+
+    def fetchall(self):
+        rows = self.timed(super().fetchall)
+        self.rows += len(rows)
+        self.finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self.timed(super().__next__)
+        except StopIteration:
+            self.finish()
+            raise
+        self.rows += 1
+        return row
+
+    def close(self):
+        self.finish()
+        super().close()
+
+    def __del__(self):
+        # fetchone() の後に捨てられたカーソルもここで記録する
+        try:
+            self.finish()
+        except Exception:
+            pass
+
+    def finish(self):
+        if self.sql is None:
+            return
+        sql, self.sql = self.sql, None
+        rows = self.rows if self.description is not None else max(self.rowcount, 0)
+
+        _sql_stats.seconds = getattr(_sql_stats, 'seconds', 0.0) + self.seconds
+        _sql_stats.queries = getattr(_sql_stats, 'queries', 0) + 1
+
+        if SLOW_QUERY_MS is not None and self.seconds * 1000 >= SLOW_QUERY_MS:
+            log_slow_query(sql, self.seconds, rows)
+
+class TimedConnection(sqlite3.Connection):
+    # Connection.execute() は標準のカーソルを使うため、計測用のカーソル経由にする
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, *args):
+        return self.cursor().execute(sql, *args)
+
+    def executemany(self, sql, *args):
+        return self.cursor().executemany(sql, *args)
+
+def connection_factory():
+    return TimedConnection if SQL_TIMING_ENABLED else sqlite3.Connection
+
+def start_request_profile(headers):
+    if PROFILE_REQUESTS == '1' or (PROFILE_REQUESTS == 'header' and headers.get(PROFILE_HEADER) == '1'):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+    return None
+
+def finish_request_profile(profiler, method, path, seconds):
+    """プロファイルを PROFILE_DIR に pstats 形式で保存し、ファイルパスを返す"""
+    profiler.disable()
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+
+    name = re.sub(r'[^A-Za-z0-9_-]+', '_', path.strip('/')) or 'index'
+    filename = f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{method}_{name}_{int(seconds * 1000)}ms.prof"
+    profile_path = os.path.join(PROFILE_DIR, filename)
+    profiler.dump_stats(profile_path)
+    return profile_path
@@ -2,7 +2,8 @@ import schedule
 import time
 import logging
 from datetime import datetime
-from youtube_analyzer import YouTubeAnalyzer
+from youtube_analyzer import YouTubeAnalyzer, STATS_REFRESH_INTERVAL_MINUTES
+from parquet_archive import export_archive
 
 # ログ設定
 logging.basicConfig(
@@ -14,35 +15,70 @@ logging.basicConfig(
     ]
 )
 
-def run_batch_analysis():
-    """5日に1回の一括分析を実行"""
+def run_archive_export():
+    """前回以降のコメント・スナップショットをParquetアーカイブに追記"""
     try:
-        logging.info("自動一括分析を開始します...")
+        result = export_archive()
+        logging.info(
+            f"アーカイブを更新しました。コメント: {result['comments']['rows']}件（{result['comments']['videos']}動画）, "
+            f"スナップショット: {result['view_snapshots']['rows']}件"
+        )
+    except Exception as e:
+        logging.error(f"アーカイブの更新でエラーが発生しました: {str(e)}")
+
+def run_adaptive_analysis():
+    """伸び率に応じた優先度で、1日のクォータ予算内の動画だけを再分析"""
+    try:
+        logging.info("優先度ベースの再分析を開始します...")
         analyzer = YouTubeAnalyzer()
-        result = analyzer.analyze_csv_urls()
+        result = analyzer.analyze_scheduled_urls()
         
         if result.get('success'):
-            logging.info(f"一括分析が完了しました。分析された動画数: {result.get('analyzed_count', 0)}")
+            logging.info(
+                f"再分析が完了しました。分析された動画数: {result.get('successful', 0)}, "
+                f"新しく見つかった動画: {result.get('discovered', 0)}, "
+                f"予算超過で見送り: {result.get('skipped_over_budget', 0)}"
+            )
         else:
-            logging.error(f"一括分析でエラーが発生しました: {result.get('error')}")
+            logging.error(f"再分析でエラーが発生しました: {result.get('error')}")
             
     except Exception as e:
         logging.error(f"スケジューラーでエラーが発生しました: {str(e)}")
+    
+    run_archive_export()
+
+def run_stats_refresh():
+    """コメントは取得せず、登録済みの全動画の統計を更新してスナップショットを追加"""
+    try:
+        analyzer = YouTubeAnalyzer()
+        result = analyzer.refresh_video_stats()
+        logging.info(
+            f"統計を更新しました。更新: {result['refreshed']}件, "
+            f"取得できなかった動画: {result['missing']}件, API呼び出し: {result['api_calls']}回"
+        )
+    except Exception as e:
+        logging.error(f"統計の更新でエラーが発生しました: {str(e)}")
 
 def start_scheduler():
     """スケジューラーを開始"""
-    # 5日に1回、午前2時に実行
-    schedule.every(5).days.at("02:00").do(run_batch_analysis)
+    # 毎日午前2時に、更新時期を迎えた動画だけを優先度順に再分析
+    schedule.every().day.at("02:00").do(run_adaptive_analysis)
+    
+    # コメントの再分析とは別に、再生数などの統計だけを短い間隔で記録（50動画ごとに1ユニット）
+    if STATS_REFRESH_INTERVAL_MINUTES > 0:
+        schedule.every(STATS_REFRESH_INTERVAL_MINUTES).minutes.do(run_stats_refresh)
     
     # 起動時に一度実行
-    logging.info("スケジューラーが開始されました。起動時の一括分析を実行します...")
-    run_batch_analysis()
+    logging.info("スケジューラーが開始されました。起動時の再分析を実行します...")
+    run_adaptive_analysis()
     
-    logging.info("5日に1回（午前2時）の自動一括分析がスケジュールされました。")
+    logging.info("毎日（午前2時）の優先度ベース再分析がスケジュールされました。")
+    if STATS_REFRESH_INTERVAL_MINUTES > 0:
+        logging.info(f"{STATS_REFRESH_INTERVAL_MINUTES}分ごとの統計更新がスケジュールされました。")
     
     while True:
         schedule.run_pending()
-        time.sleep(3600)  # 1時間ごとにチェック
+        time.sleep(60)  # 1分ごとにチェック
 
 if __name__ == "__main__":
     start_scheduler()
\ No newline at end of file
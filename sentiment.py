@@ -0,0 +1,213 @@
+import os
+import re
+
+from textblob import TextBlob
+
+# 日本語（ひらがな・カタカナ・漢字・半角カナ）を含むかどうか
+JAPANESE_PATTERN = re.compile(r'[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff66-\uff9f]')
+LATIN_PATTERN = re.compile(r'[A-Za-z]')
+
+class SentimentBackend:
+    """感情分析バックエンドの共通インターフェース
+
+    analyze(text) は (polarity, label) を返す。polarity は -1.0〜1.0、
+    label は 'positive' / 'negative' / 'neutral' のいずれか。
+    """
+
+    name = None
+
+    def analyze(self, text):
+        raise NotImplementedError
+
+class TextBlobKeywordBackend(SentimentBackend):
+    """TextBlobの極性にキーワード判定を組み合わせた従来の分析"""
+
+    name = 'textblob'
+
+    strong_positive_keywords = [
+        '最高', '素晴らしい', '神', '感動', '大好き', '愛してる', 'すげー', 'すげえ', 'やばい', 'ヤバい',
+        'amazing', 'awesome', 'love', 'perfect', '完璧', '天才', 'かっこいい', 'イケメン', '美しい'
+    ]
+
+    positive_keywords = [
+        '好き', 'いい', '良い', 'すごい', '面白い', '楽しい', 'ありがとう', '可愛い', 'かわいい',
+        '素敵', '感謝', '嬉しい', 'うれしい', '笑', 'ナイス', 'nice', 'good', 'great', 'cool'
+    ]
+
+    strong_negative_keywords = [
+        '最悪', '死ね', 'クソ', 'くそ', 'ゴミ', 'きもい', 'うざい', 'ムカつく', 'イライラ',
+        'hate', 'terrible', 'awful', 'worst', 'stupid', '大嫌い', 'ひどい', '腹立つ'
+    ]
+
+    negative_keywords = [
+        '嫌い', '悪い', 'つまらない', '退屈', '残念', 'がっかり', 'だめ', 'ダメ', '悲しい',
+        'bad', 'boring', 'disappointed'
+    ]
+
+    # ネガティブではない一般的な表現を除外
+    neutral_expressions = [
+        '思う', '思った', '感じ', '感じる', '考え', '見る', '聞く', '言う', '話', '時間',
+        '今日', '明日', '昨日', '最近', '前', '後', '中', '上', '下', '右', '左'
+    ]
+
+    def analyze(self, text):
+        blob = TextBlob(text)
+        polarity = blob.sentiment.polarity
+
+        # より慎重な感情分析（バランス重視）
+        if polarity > 0.05:
+            label = 'positive'
+        elif polarity < -0.05:
+            label = 'negative'
+        else:
+            label = 'neutral'
+
+        text_clean = text.lower().replace(' ', '').replace('　', '')
+
+        # 強いキーワードのチェック
+        strong_positive_count = sum(1 for word in self.strong_positive_keywords if word in text_clean)
+        strong_negative_count = sum(1 for word in self.strong_negative_keywords if word in text_clean)
+
+        # 通常のキーワードのチェック
+        positive_count = sum(1 for word in self.positive_keywords if word in text_clean)
+        negative_count = sum(1 for word in self.negative_keywords if word in text_clean)
+
+        # ニュートラル表現のチェック
+        neutral_count = sum(1 for word in self.neutral_expressions if word in text_clean)
+
+        # 強いキーワードが優先
+        if strong_positive_count > 0 and strong_negative_count == 0:
+            label = 'positive'
+            polarity = max(polarity, 0.3)
+        elif strong_negative_count > 0 and strong_positive_count == 0:
+            label = 'negative'
+            polarity = min(polarity, -0.3)
+        elif strong_positive_count > 0 and strong_negative_count > 0:
+            # 両方ある場合は多い方
+            if strong_positive_count > strong_negative_count:
+                label = 'positive'
+                polarity = max(polarity, 0.2)
+            else:
+                label = 'negative'
+                polarity = min(polarity, -0.2)
+        else:
+            # 通常のキーワードでの判定
+            total_positive = positive_count
+            total_negative = negative_count
+
+            # ニュートラル表現が多い場合は感情を弱める
+            if neutral_count > 2:
+                total_positive *= 0.5
+                total_negative *= 0.5
+
+            if total_positive > total_negative and total_positive > 0:
+                if polarity >= -0.1:  # あまりにネガティブでなければ
+                    label = 'positive'
+                    polarity = max(polarity, 0.1)
+            elif total_negative > total_positive and total_negative > 0:
+                if polarity <= 0.1:  # あまりにポジティブでなければ
+                    label = 'negative'
+                    polarity = min(polarity, -0.1)
+            else:
+                # キーワードが同数または無い場合、元のpolarityを尊重
+                if polarity > 0.02:
+                    label = 'positive'
+                elif polarity < -0.02:
+                    label = 'negative'
+                else:
+                    label = 'neutral'
+
+        return polarity, label
+
+class LexiconBackend(SentimentBackend):
+    """重み付き辞書による高速な日本語向け感情分析
+
+    辞書の全語を長い順に並べた1つの正規表現にまとめてコンパイルし、
+    1回の走査で重なりなく一致した語の重みを合計する。否定形（「好きじゃない」など）は
+    元の語より長いので優先して一致する。
+    """
+
+    name = 'lexicon'
+
+    lexicon = {
+        # 強いポジティブ
+        '最高': 2, '素晴らしい': 2, '神': 2, '感動': 2, '大好き': 2, '愛してる': 2, 'すげー': 2, 'すげえ': 2,
+        'やばい': 2, 'ヤバい': 2, '完璧': 2, '天才': 2, 'かっこいい': 2, 'カッコいい': 2, 'イケメン': 2,
+        '美しい': 2, '尊い': 2, '鳥肌': 2, '震えた': 2, '泣ける': 1.5, 'エモい': 1.5, '天使': 2,
+        'amazing': 2, 'awesome': 2, 'love': 2, 'perfect': 2,
+        # ポジティブ
+        '好き': 1, 'いい': 1, '良い': 1, 'すごい': 1, '凄い': 1, '面白い': 1, '楽しい': 1, 'ありがとう': 1,
+        '可愛い': 1, 'かわいい': 1, '素敵': 1, '感謝': 1, '嬉しい': 1, 'うれしい': 1, 'ナイス': 1,
+        '応援': 1, '推し': 1, '楽しみ': 1, '綺麗': 1, 'きれい': 1, '上手': 1, 'おめでとう': 1, '中毒': 1,
+        '笑': 0.5, 'nice': 1, 'good': 1, 'great': 1, 'cool': 1,
+        '❤': 1, '♥': 1, '😍': 2, '🥰': 2, '👏': 1, '👍': 1, '🔥': 1, '✨': 0.5,
+        # 強いネガティブ
+        '最悪': -2, '死ね': -2, 'クソ': -2, 'くそ': -2, 'ゴミ': -2, 'きもい': -2, 'キモい': -2, 'うざい': -2,
+        'ムカつく': -2, 'イライラ': -2, '大嫌い': -2, 'ひどい': -2, '酷い': -2, '腹立つ': -2,
+        'hate': -2, 'terrible': -2, 'awful': -2, 'worst': -2, 'stupid': -2,
+        # ネガティブ
+        '嫌い': -1, '悪い': -1, 'つまらない': -1, '退屈': -1, '残念': -1, 'がっかり': -1, 'だめ': -1,
+        'ダメ': -1, '悲しい': -1, '微妙': -1, '下手': -1, '劣化': -1, '寂しい': -0.5,
+        'bad': -1, 'boring': -1, 'disappointed': -1,
+        # 否定形（元の語より長いので優先して一致する）
+        '好きじゃない': -1, '好きではない': -1, 'よくない': -1, '良くない': -1, 'いいとは思わない': -1,
+        '面白くない': -1, '楽しくない': -1, '嬉しくない': -1, '可愛くない': -1, 'かわいくない': -1,
+        '悪くない': 1, '嫌いじゃない': 1, '嫌いではない': 1, 'ダメじゃない': 0,
+    }
+
+    def __init__(self):
+        terms = sorted(self.lexicon, key=len, reverse=True)
+        self.pattern = re.compile('|'.join(re.escape(term) for term in terms))
+
+    def score(self, text):
+        text_clean = text.lower().replace(' ', '').replace('　', '')
+        lexicon = self.lexicon
+        return sum(lexicon[match.group(0)] for match in self.pattern.finditer(text_clean))
+
+    def analyze(self, text):
+        score = self.score(text)
+
+        # 合計スコアを -1.0〜1.0 に収める（1語で±0.33、強い語で±0.5）
+        polarity = score / (abs(score) + 2)
+
+        if score > 0:
+            label = 'positive'
+        elif score < 0:
+            label = 'negative'
+        else:
+            label = 'neutral'
+
+        return polarity, label
+
+class ScriptRouterBackend(SentimentBackend):
+    """文字種で振り分ける分析: 日本語を含む文は辞書、ラテン文字のみの文はTextBlob"""
+
+    name = 'router'
+
+    def __init__(self):
+        self.lexicon = LexiconBackend()
+        self.textblob = TextBlobKeywordBackend()
+
+    def analyze(self, text):
+        if not JAPANESE_PATTERN.search(text) and LATIN_PATTERN.search(text):
+            return self.textblob.analyze(text)
+        return self.lexicon.analyze(text)
+
+BACKENDS = {
+    backend.name: backend
+    for backend in (TextBlobKeywordBackend, LexiconBackend, ScriptRouterBackend)
+}
+
+_instances = {}
+
+def get_backend(name=None):
+    """設定（SENTIMENT_BACKEND）で選択された感情分析バックエンドを返す"""
+    if name is None:
+        name = os.environ.get('SENTIMENT_BACKEND', 'router')
+
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown sentiment backend: {name} (choose from {', '.join(BACKENDS)})")
+
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
@@ -0,0 +1,36 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_analyzer
+
+
+@pytest.fixture
+def analyzer(tmp_path, monkeypatch):
+    """YouTube APIと感情分析モデルを使わず、一時ディレクトリのDBで動く YouTubeAnalyzer"""
+    monkeypatch.setenv('YOUTUBE_API_KEY', 'test')
+    monkeypatch.setattr(youtube_analyzer, 'build', lambda *args, **kwargs: None)
+    monkeypatch.setattr(youtube_analyzer, 'get_backend', lambda: None)
+    monkeypatch.setattr(youtube_analyzer, 'DB_PATH', str(tmp_path / 'test.db'))
+    monkeypatch.setattr(youtube_analyzer, 'READ_SNAPSHOT_PATH', str(tmp_path / 'test.read.db'))
+    monkeypatch.setattr(youtube_analyzer, 'READ_SNAPSHOT_ENABLED', False)
+
+    analyzer = youtube_analyzer.YouTubeAnalyzer()
+    analyzer.analyze_sentiment = lambda text: (0.5, 'positive')
+    return analyzer
+
+
+def video_info(video_id, **overrides):
+    info = {
+        'id': video_id,
+        'title': f'Video {video_id}',
+        'view_count': 1000,
+        'like_count': 10,
+        'comment_count': 10,
+        'published_at': '2023-01-01T00:00:00Z'
+    }
+    info.update(overrides)
+    return info
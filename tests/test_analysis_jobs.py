@@ -0,0 +1,90 @@
+import json
+import time
+
+import pytest
+
+import analysis_jobs
+
+
+@pytest.fixture
+def jobs(analyzer, monkeypatch):
+    """ジョブの登録・配信だけを試す（分析のスレッドは何もしない）"""
+    monkeypatch.setattr(analysis_jobs, 'DB_PATH', analyzer.db_path)
+    monkeypatch.setattr(analysis_jobs, 'run_job', lambda job_id, kind, params: None)
+    monkeypatch.setattr(analysis_jobs, 'SSE_POLL_SECONDS', 0)
+    return analyzer
+
+
+def events(job_id, last_event_id=0):
+    return [
+        chunk.split('\n')[1].split(': ', 1)[1]
+        for chunk in analysis_jobs.stream_events(job_id, last_event_id)
+        if chunk.startswith('id: ')
+    ]
+
+
+def test_identical_running_jobs_are_deduplicated(jobs):
+    job_id = analysis_jobs.start_job('csv')
+
+    assert analysis_jobs.start_job('csv') == job_id
+    assert analysis_jobs.start_job('video', {'video_url': 'https://youtu.be/aaaaaaaaaaa'}) != job_id
+
+    analysis_jobs.finish_job(job_id, 'done', {'success': True})
+    assert analysis_jobs.start_job('csv') != job_id
+
+
+def test_job_without_heartbeat_is_marked_failed(jobs):
+    job_id = analysis_jobs.start_job('csv')
+    with jobs.get_db_connection() as conn:
+        conn.execute('UPDATE analysis_jobs SET heartbeat_at = ?', (time.time() - analysis_jobs.JOB_STALE_SECONDS - 1,))
+        conn.commit()
+
+    assert events(job_id) == ['started', 'failed']
+    job = analysis_jobs.get_job(job_id)
+    assert job['status'] == 'failed'
+    assert '中断' in job['result']['error']
+
+    # 中断したジョブは重複とみなさず、新しく開始できる
+    assert analysis_jobs.start_job('csv') != job_id
+
+
+def test_finished_jobs_are_pruned_after_the_retention_window(jobs):
+    old_job = analysis_jobs.start_job('csv')
+    analysis_jobs.publish_event(old_job, 'done', {'success': True})
+    analysis_jobs.finish_job(old_job, 'done', {'success': True})
+    recent_job = analysis_jobs.start_job('video', {'video_url': 'https://youtu.be/aaaaaaaaaaa'})
+    analysis_jobs.finish_job(recent_job, 'done', {'success': True})
+
+    with jobs.get_db_connection() as conn:
+        conn.execute("UPDATE analysis_jobs SET finished_at = datetime('now', '-2 days') WHERE id = ?", (old_job,))
+        conn.commit()
+
+    running_job = analysis_jobs.start_job('csv')
+
+    assert analysis_jobs.get_job(old_job) is None
+    assert analysis_jobs.get_job(recent_job)['status'] == 'done'
+    with jobs.get_db_connection() as conn:
+        remaining = {row[0] for row in conn.execute('SELECT DISTINCT job_id FROM analysis_events')}
+    assert remaining == {recent_job, running_job}
+
+    chunks = list(analysis_jobs.stream_events(old_job))
+    assert json.loads(chunks[-1].split('data: ', 1)[1]) == {'error': 'Job not found'}
+
+
+def test_keep_alive_records_the_heartbeat_until_stopped(jobs, monkeypatch):
+    monkeypatch.setattr(analysis_jobs, 'JOB_HEARTBEAT_SECONDS', 0.01)
+    job_id = analysis_jobs.start_job('csv')
+    with jobs.get_db_connection() as conn:
+        conn.execute('UPDATE analysis_jobs SET heartbeat_at = 0')
+        conn.commit()
+
+    stopped = analysis_jobs.threading.Event()
+    thread = analysis_jobs.threading.Thread(target=analysis_jobs.keep_alive, args=(job_id, stopped))
+    thread.start()
+    time.sleep(0.1)
+    stopped.set()
+    thread.join()
+
+    with jobs.get_db_connection() as conn:
+        heartbeat_at = conn.execute('SELECT heartbeat_at FROM analysis_jobs WHERE id = ?', (job_id,)).fetchone()[0]
+    assert heartbeat_at > time.time() - 5
@@ -0,0 +1,133 @@
+from datetime import datetime
+
+import pytest
+
+from analytics_cube import AnalyticsCube, month_key_add, month_key_diff
+from conftest import video_info
+from youtube_analyzer import insert_view_snapshot, prune_analytics_changes
+
+
+def save_video(analyzer, video_id, months, published_at='2023-01-01T00:00:00Z'):
+    # months: {'2024-01': コメント数}
+    comments = [
+        {
+            'id': f'{video_id}_{month}_{i}',
+            'text': f'{video_id} {month} {i}',
+            'published_at': f'{month}-15T00:00:00Z',
+            'like_count': 0,
+            'sentiment_score': 0.5,
+            'sentiment_label': 'positive'
+        }
+        for month, count in months.items()
+        for i in range(count)
+    ]
+    analyzer.save_video_data(video_info(video_id, published_at=published_at), comments)
+
+
+def add_snapshot(analyzer, video_id, view_count, when):
+    with analyzer.get_db_connection() as conn:
+        insert_view_snapshot(conn.cursor(), video_info(video_id, view_count=view_count), when)
+        conn.commit()
+
+
+def synced_cube(analyzer, cube=None):
+    cube = cube or AnalyticsCube()
+    with analyzer.get_db_connection() as conn:
+        cube.sync(conn)
+    return cube
+
+
+def test_month_key_arithmetic_crosses_years():
+    assert month_key_add(202411, 3) == 202502
+    assert month_key_add(202401, -1) == 202312
+    assert month_key_diff(202502, 202411) == 3
+
+
+def test_comments_matrix_orders_videos_and_skips_empty_months(analyzer):
+    save_video(analyzer, 'late', {'2024-03': 1}, published_at='2023-06-01T00:00:00Z')
+    save_video(analyzer, 'early', {'2024-01': 2, '2024-03': 4}, published_at='2023-01-01T00:00:00Z')
+
+    video_ids, month_keys, counts = synced_cube(analyzer).comments_matrix()
+
+    assert video_ids == ['early', 'late']
+    assert month_keys == [202401, 202403]
+    assert counts.tolist() == [[2, 4], [0, 1]]
+
+
+def test_select_slices_the_month_range(analyzer):
+    save_video(analyzer, 'a', {'2024-01': 1, '2024-02': 2, '2024-03': 3, '2024-04': 4})
+    cube = synced_cube(analyzer)
+
+    _, months = cube.select(month_from=202402, month_to=202403)
+    assert cube.comments[0, months].tolist() == [2, 3]
+
+    # 範囲外の指定は端で切り詰め、逆転した範囲は空になる
+    assert cube.select(month_from=202301, month_to=202312)[1] == slice(0, 0)
+    assert cube.select(month_from=202403, month_to=209912)[1] == slice(2, cube.month_count)
+    assert cube.select(month_from=202404, month_to=202402)[1] == slice(3, 3)
+
+    _, month_keys, counts = cube.comments_matrix(month_from=202402, month_to=202403)
+    assert month_keys == [202402, 202403]
+    assert counts.tolist() == [[2, 3]]
+
+    ranking = cube.rankings('comments', 1, month_to=202402)
+    assert [(r['month_key'], r['total_comments']) for r in ranking] == [(202402, 2)]
+
+
+def test_views_matrix_keeps_the_latest_snapshot_per_month(analyzer):
+    save_video(analyzer, 'a', {'2024-01': 1})
+    add_snapshot(analyzer, 'a', 100, datetime(2024, 1, 5))
+    add_snapshot(analyzer, 'a', 150, datetime(2024, 1, 20))
+    add_snapshot(analyzer, 'a', 300, datetime(2024, 3, 1))
+
+    video_ids, month_keys, views = synced_cube(analyzer).views_matrix(month_from=202401, month_to=202403)
+
+    assert video_ids == ['a']
+    assert month_keys == [202401, 202403]
+    assert views.tolist() == [[150, 300]]
+
+
+def test_sync_applies_updates_and_deletes_incrementally(analyzer):
+    save_video(analyzer, 'a', {'2024-01': 1})
+    save_video(analyzer, 'b', {'2024-02': 2})
+    cube = synced_cube(analyzer)
+
+    save_video(analyzer, 'a', {'2024-01': 1, '2023-12': 5})
+    analyzer.delete_video_data('b')
+    synced_cube(analyzer, cube)
+
+    video_ids, month_keys, counts = cube.comments_matrix()
+    assert video_ids == ['a']
+    assert month_keys == [202312, 202401]
+    assert counts.tolist() == [[5, 1]]
+    assert [r['video_id'] for r in cube.rankings('comments', 10)] == ['a', 'a']
+    assert cube.views_matrix()[0] == ['a']
+
+
+def test_sync_after_clear_all_data_empties_the_cube(analyzer):
+    save_video(analyzer, 'a', {'2024-01': 1})
+    cube = synced_cube(analyzer)
+
+    analyzer.clear_all_data()
+    synced_cube(analyzer, cube)
+
+    assert cube.comments_matrix()[0] == []
+    assert cube.views_matrix()[0] == []
+    assert cube.rankings('comments', 10) == []
+
+
+@pytest.mark.parametrize('retain', [0, 1])
+def test_sync_reloads_when_unapplied_changes_were_pruned(analyzer, retain):
+    save_video(analyzer, 'a', {'2024-01': 1})
+    cube = synced_cube(analyzer)
+
+    save_video(analyzer, 'b', {'2024-02': 2})
+    save_video(analyzer, 'a', {'2024-01': 3})
+    with analyzer.get_db_connection() as conn:
+        prune_analytics_changes(conn.cursor(), retain=retain)
+        conn.commit()
+    synced_cube(analyzer, cube)
+
+    video_ids, month_keys, counts = cube.comments_matrix()
+    assert video_ids == ['a', 'b']
+    assert counts.tolist() == [[3, 0], [0, 2]]
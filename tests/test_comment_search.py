@@ -0,0 +1,43 @@
+import pytest
+
+from conftest import video_info
+
+
+@pytest.fixture
+def searchable(analyzer):
+    texts = ['森田ひかるのダンスが最高', '森田さんかわいい', '天ちゃんの歌声が最高', 'ダンスが揃っていて最高']
+    for video_id in ('vid1', 'vid2'):
+        analyzer.save_video_data(video_info(video_id), [
+            {
+                'id': f'{video_id}_{i}',
+                'text': text,
+                'published_at': '2024-01-15T00:00:00Z',
+                'like_count': i,
+                'sentiment_score': 0.5,
+                'sentiment_label': 'positive'
+            }
+            for i, text in enumerate(texts)
+        ])
+    return analyzer
+
+
+def texts(result):
+    return sorted((c['video_id'], c['text']) for c in result['results'])
+
+
+def test_short_term_alone_is_rejected(searchable):
+    with pytest.raises(ValueError, match='森田'):
+        searchable.search_comments('森田')
+
+
+def test_short_term_narrows_a_trigram_match(searchable):
+    result = searchable.search_comments('最高 森田', video_id='vid1')
+    assert texts(result) == [('vid1', '森田ひかるのダンスが最高')]
+
+    result = searchable.search_comments('ダンス 森田')
+    assert texts(result) == [('vid1', '森田ひかるのダンスが最高'), ('vid2', '森田ひかるのダンスが最高')]
+
+
+def test_short_term_is_allowed_within_one_video(searchable):
+    result = searchable.search_comments('森田', video_id='vid2')
+    assert texts(result) == [('vid2', '森田さんかわいい'), ('vid2', '森田ひかるのダンスが最高')]
@@ -0,0 +1,115 @@
+import math
+from datetime import datetime
+
+import pytest
+
+from conftest import video_info
+from youtube_analyzer import (
+    GROWTH_LONG_DAYS, GROWTH_MIN_INTERVAL_DAYS, GROWTH_SHORT_DAYS,
+    insert_view_snapshot, rebuild_growth_metrics, update_growth_metrics
+)
+
+DAY = 86400
+START = datetime(2024, 1, 1).timestamp()
+
+
+@pytest.fixture
+def cursor(analyzer):
+    conn = analyzer.get_db_connection()
+    yield conn.cursor()
+    conn.close()
+
+
+def metrics(cursor, video_id='vid'):
+    cursor.execute('''
+        SELECT snapshot_at, view_count, views_per_day, views_per_day_7d, views_per_day_30d,
+               comments_per_day_7d, acceleration, intervals
+        FROM growth_metrics
+        WHERE video_id = ?
+    ''', (video_id,))
+    return dict(zip(
+        ('snapshot_at', 'view_count', 'views_per_day', 'views_per_day_7d', 'views_per_day_30d',
+         'comments_per_day_7d', 'acceleration', 'intervals'),
+        cursor.fetchone()
+    ))
+
+
+def test_first_snapshot_only_records_the_baseline(cursor):
+    update_growth_metrics(cursor, 'vid', 1000, 10, 5, START)
+
+    row = metrics(cursor)
+    assert row['snapshot_at'] == START
+    assert row['view_count'] == 1000
+    assert row['views_per_day'] is None
+    assert row['views_per_day_7d'] is None
+    assert row['intervals'] == 0
+
+
+def test_short_interval_keeps_the_previous_baseline(cursor):
+    update_growth_metrics(cursor, 'vid', 1000, 10, 5, START)
+    short = GROWTH_MIN_INTERVAL_DAYS * DAY / 2
+    update_growth_metrics(cursor, 'vid', 5000, 10, 5, START + short)
+
+    row = metrics(cursor)
+    assert row['snapshot_at'] == START
+    assert row['view_count'] == 1000
+    assert row['intervals'] == 0
+
+    # 次のスナップショットは最初の基準から計算する
+    update_growth_metrics(cursor, 'vid', 3000, 10, 5, START + 2 * DAY)
+    row = metrics(cursor)
+    assert row['views_per_day'] == pytest.approx(1000)
+    assert row['intervals'] == 1
+
+
+def test_first_interval_seeds_both_averages_with_the_rate(cursor):
+    update_growth_metrics(cursor, 'vid', 1000, 10, 5, START)
+    update_growth_metrics(cursor, 'vid', 1500, 12, 8, START + DAY / 2)
+
+    row = metrics(cursor)
+    assert row['views_per_day'] == pytest.approx(1000)
+    assert row['views_per_day_7d'] == pytest.approx(1000)
+    assert row['views_per_day_30d'] == pytest.approx(1000)
+    assert row['comments_per_day_7d'] == pytest.approx(6)
+    assert row['acceleration'] == pytest.approx(0)
+
+
+@pytest.mark.parametrize('interval_days', [GROWTH_MIN_INTERVAL_DAYS, 1, 30])
+def test_averages_weight_the_new_rate_by_interval_length(cursor, interval_days):
+    update_growth_metrics(cursor, 'vid', 0, 0, 0, START)
+    update_growth_metrics(cursor, 'vid', 100, 0, 0, START + DAY)
+    view_count = 100 + 300 * interval_days
+    update_growth_metrics(cursor, 'vid', view_count, 0, 0, START + DAY + interval_days * DAY)
+
+    short = 100 + (1 - math.exp(-interval_days / GROWTH_SHORT_DAYS)) * 200
+    long = 100 + (1 - math.exp(-interval_days / GROWTH_LONG_DAYS)) * 200
+    row = metrics(cursor)
+    assert row['views_per_day'] == pytest.approx(300)
+    assert row['views_per_day_7d'] == pytest.approx(short)
+    assert row['views_per_day_30d'] == pytest.approx(long)
+    assert row['acceleration'] == pytest.approx((short - long) / (long + 1))
+    assert row['intervals'] == 2
+
+
+def test_long_interval_moves_the_short_average_further_than_the_long_one(cursor):
+    update_growth_metrics(cursor, 'vid', 0, 0, 0, START)
+    update_growth_metrics(cursor, 'vid', 100, 0, 0, START + DAY)
+    update_growth_metrics(cursor, 'vid', 100 + 300 * 30, 0, 0, START + 31 * DAY)
+
+    row = metrics(cursor)
+    assert 100 < row['views_per_day_30d'] < row['views_per_day_7d'] < 300
+    assert row['acceleration'] > 0
+
+
+def test_rebuild_replays_snapshots_like_incremental_updates(cursor):
+    for day, (hour, views) in enumerate([(0, 100), (0, 400), (1, 450), (0, 1200), (0, 5000)]):
+        when = datetime(2024, 1, 1 + day, hour)
+        insert_view_snapshot(cursor, video_info('vid', view_count=views), when)
+    incremental = metrics(cursor)
+
+    rebuild_growth_metrics(cursor)
+    rebuilt = metrics(cursor)
+
+    assert rebuilt.keys() == incremental.keys()
+    for key, value in incremental.items():
+        assert rebuilt[key] == pytest.approx(value)
@@ -0,0 +1,101 @@
+from conftest import video_info
+from near_duplicates import cluster_near_duplicates, normalize_text
+
+CHANT = '推しが尊い！今日も最高のステージありがとう'
+
+
+def test_normalize_text_folds_width_case_whitespace_and_repeats():
+    assert normalize_text('ＬＯＶＥ  this\nwwwww') == normalize_text('love this ww')
+
+
+def test_cluster_near_duplicates_groups_copies_and_keeps_distinct_comments():
+    texts = [
+        CHANT,
+        'まったく関係のない感想です',
+        CHANT + '！！！！',
+        '推しが尊い！今日も最高のステージありがと',
+        'I really enjoyed the bridge section of this song',
+    ]
+    clusters = sorted(cluster_near_duplicates(texts))
+    assert clusters == [[0, 2, 3], [1], [4]]
+
+
+def test_cluster_near_duplicates_handles_empty_and_single_input():
+    assert cluster_near_duplicates([]) == []
+    assert cluster_near_duplicates(['一件だけ']) == [[0]]
+
+
+def analyze_window(analyzer, comment_ids, likes):
+    # 分析のたびに異なる範囲のコメントを取得する（どれも同じ定型文）
+    comments = [
+        {
+            'id': f'c{i}',
+            'text': CHANT,
+            'published_at': f'2024-0{1 + i % 3}-01T00:00:00Z',
+            'like_count': likes.get(i, 0)
+        }
+        for i in comment_ids
+    ]
+    analyzer.get_video_info = lambda video_id: video_info(video_id)
+    analyzer.get_video_comments = lambda video_id: comments
+    return analyzer.analyze_video('https://www.youtube.com/watch?v=vid')
+
+
+def stored_clusters(analyzer):
+    with analyzer.get_db_connection() as conn:
+        representatives = dict(conn.execute('SELECT id, duplicate_count FROM comments').fetchall())
+        members = dict(conn.execute('SELECT id, representative_id FROM comment_duplicates').fetchall())
+        monthly_total = conn.execute('SELECT SUM(total_comments) FROM monthly_stats').fetchone()[0]
+    return representatives, members, monthly_total
+
+
+def test_reanalysis_moves_members_to_the_new_representative(analyzer):
+    result = analyze_window(analyzer, range(0, 6), {5: 9})
+    assert result['total_comments_analyzed'] == 6
+
+    representatives, members, monthly_total = stored_clusters(analyzer)
+    assert representatives == {'c5': 6}
+    assert set(members.values()) == {'c5'}
+    assert monthly_total == 6
+
+    # c5 は今回も取得されるが、いいね数の多い c7 が代表になる。c0〜c2 は取得範囲から外れる
+    analyze_window(analyzer, range(3, 8), {5: 9, 7: 20})
+
+    representatives, members, monthly_total = stored_clusters(analyzer)
+    assert representatives == {'c7': 8}
+    assert members == {f'c{i}': 'c7' for i in range(8) if i != 7}
+    assert monthly_total == 8
+
+
+def test_reanalysis_counts_members_from_storage_not_the_fetch_window(analyzer):
+    analyze_window(analyzer, range(0, 6), {5: 9})
+    analyze_window(analyzer, range(3, 8), {7: 20})
+    analyze_window(analyzer, range(6, 10), {9: 30})
+
+    representatives, members, monthly_total = stored_clusters(analyzer)
+    assert representatives == {'c9': 10}
+    assert len(members) == 9
+    assert monthly_total == 10
+    assert analyzer.get_all_videos()[0]['total_comments_analyzed'] == 10
+    assert sum(analyzer.get_fresh_analysis('vid', 60)['sentiment_summary'].values()) == 10
+
+
+def test_delete_video_data_removes_cluster_members(analyzer):
+    analyze_window(analyzer, range(0, 4), {})
+    analyzer.delete_video_data('vid')
+
+    representatives, members, monthly_total = stored_clusters(analyzer)
+    assert representatives == {}
+    assert members == {}
+    assert monthly_total is None
+
+
+def test_cached_analysis_has_the_same_shape_as_a_fresh_one(analyzer):
+    fresh = analyze_window(analyzer, range(0, 4), {})
+    cached = analyzer.analyze_video_cached('https://www.youtube.com/watch?v=vid')
+
+    assert cached['cached'] is True and fresh['cached'] is False
+    assert cached.keys() == fresh.keys()
+    assert cached['video_info'].keys() == fresh['video_info'].keys()
+    assert cached['duplicate_comments'] == fresh['duplicate_comments'] == 3
+    assert cached['analyzed_at'] == fresh['analyzed_at']
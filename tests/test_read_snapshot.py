@@ -0,0 +1,71 @@
+import time
+
+import pytest
+
+import youtube_analyzer
+from conftest import video_info
+from youtube_analyzer import INGEST_ONLY_TABLES, connect_read_snapshot
+
+
+@pytest.fixture
+def snapshot_analyzer(analyzer, monkeypatch):
+    monkeypatch.setattr(youtube_analyzer, 'READ_SNAPSHOT_ENABLED', True)
+    monkeypatch.setattr(youtube_analyzer, 'DASHBOARD_PATH', analyzer.snapshot_path + '.dashboard.json')
+    analyzer.save_video_data(video_info('vid'), [])
+    return analyzer
+
+
+def snapshot_tables(analyzer):
+    with connect_read_snapshot(analyzer.snapshot_path) as conn:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+
+def wait_for_background_publish(analyzer):
+    deadline = time.monotonic() + 10
+    while analyzer.db_path in youtube_analyzer._background_publishes:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_snapshot_leaves_out_ingest_only_tables(snapshot_analyzer):
+    assert snapshot_analyzer.publish_read_snapshot()
+
+    tables = snapshot_tables(snapshot_analyzer)
+    assert {'videos', 'comments', 'comments_fts', 'analytics_changes', 'video_summary'} <= tables
+    assert tables.isdisjoint(INGEST_ONLY_TABLES)
+
+
+def test_delete_publishes_in_the_background(snapshot_analyzer, monkeypatch):
+    snapshot_analyzer.publish_read_snapshot()
+    publishes = []
+    publish = snapshot_analyzer.publish_read_snapshot
+    monkeypatch.setattr(snapshot_analyzer, 'publish_read_snapshot', lambda: publishes.append(1) or publish())
+
+    snapshot_analyzer.delete_video_data('vid')
+    wait_for_background_publish(snapshot_analyzer)
+
+    assert publishes
+    assert snapshot_analyzer.get_all_videos() == []
+
+
+def test_requests_during_a_publish_are_coalesced(snapshot_analyzer, monkeypatch):
+    started = youtube_analyzer.threading.Event()
+    release = youtube_analyzer.threading.Event()
+    publishes = []
+
+    def slow_publish():
+        publishes.append(1)
+        started.set()
+        release.wait(10)
+        return True
+
+    monkeypatch.setattr(snapshot_analyzer, 'publish_read_snapshot', slow_publish)
+
+    snapshot_analyzer.request_read_snapshot_publish()
+    started.wait(10)
+    for _ in range(5):
+        snapshot_analyzer.request_read_snapshot_publish()
+    release.set()
+    wait_for_background_publish(snapshot_analyzer)
+
+    assert len(publishes) == 2
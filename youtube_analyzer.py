@@ -1,5 +1,13 @@
 import os
 import re
+import math
+import html
+import zlib
+import calendar
+import time
+import uuid
+import socket
+import threading
 from datetime import datetime, timedelta
 from collections import defaultdict, Counter
 import sqlite3
@@ -7,12 +15,705 @@ import json
 
 from dotenv import load_dotenv
 from googleapiclient.discovery import build
-from textblob import TextBlob
 import requests
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urlparse, parse_qs, quote
+
+from analytics_cube import get_cube, month_key_add
+from near_duplicates import cluster_near_duplicates
+from profiling import connection_factory
+from sentiment import get_backend
 
 load_dotenv()
 
+DB_PATH = os.environ.get('DB_PATH', 'youtube_analysis.db')
+# 以前のDocker Compose構成などで使っていたDBの場所（DB_PATH が別の場所で、まだ移動していない場合に警告する）
+LEGACY_DB_PATH = 'youtube_analysis.db'
+
+# ダッシュボードの読み取り用スナップショット。取り込み側がバッチの区切りで公開し、
+# Flaskの読み取りエンドポイントは本DBではなくこちらを読み取り専用で開く
+READ_SNAPSHOT_ENABLED = os.environ.get('READ_SNAPSHOT', '1') != '0'
+READ_SNAPSHOT_PATH = os.environ.get('READ_SNAPSHOT_PATH') or os.path.splitext(DB_PATH)[0] + '.read.db'
+# スナップショットの公開時に書き出す、ダッシュボードの初期表示用データ（/dashboard がそのまま返す）
+DASHBOARD_PATH = os.environ.get('DASHBOARD_PATH') or os.path.splitext(DB_PATH)[0] + '.dashboard.json'
+# 一括分析ではこの本数の動画を分析するごとにスナップショットを公開する
+SNAPSHOT_CHECKPOINT_VIDEOS = int(os.environ.get('SNAPSHOT_CHECKPOINT_VIDEOS', 10))
+
+# 日別の再生数グラフで期間を指定しない場合に表示する日数
+DAILY_VIEWS_CHART_DAYS = int(os.environ.get('DAILY_VIEWS_CHART_DAYS', 90))
+
+# analytics_changes に残す直近の変更数（これより古い変更は公開時に削除し、
+# それより前から同期していないキューブは全体を再読み込みする）
+ANALYTICS_CHANGES_RETAIN = int(os.environ.get('ANALYTICS_CHANGES_RETAIN', 100000))
+
+# videos.list で一度に問い合わせる動画数（APIの上限。1回1ユニット）
+VIDEOS_LIST_BATCH_SIZE = 50
+
+# 統計だけの更新（再生数・高評価数・コメント数のスナップショット）の間隔（分、0で無効）
+STATS_REFRESH_INTERVAL_MINUTES = int(os.environ.get('STATS_REFRESH_INTERVAL_MINUTES', 60))
+
+# スキーマバージョン（PRAGMA user_version に保存）
+SCHEMA_VERSION = 2
+
+# 感情ラベルは整数コードで保存する
+SENTIMENT_CODES = {'positive': 1, 'neutral': 0, 'negative': -1}
+SENTIMENT_LABELS = {code: label for label, code in SENTIMENT_CODES.items()}
+
+# この長さ（UTF-8バイト数）以上のコメント本文はzlib圧縮して保存する
+COMMENT_COMPRESS_MIN_BYTES = int(os.environ.get('COMMENT_COMPRESS_MIN_BYTES', 256))
+
+# コピペ・定型文・スパムなどの近似重複コメントをまとめ、クラスターの代表だけを分析・保存する
+NEAR_DUPLICATE_DETECTION = os.environ.get('NEAR_DUPLICATE_DETECTION', '1') != '0'
+# この件数以上のクラスターをスパムとみなし、DISCOUNT_SPAM_CLUSTERS=1 なら月別集計で1件として数える
+SPAM_CLUSTER_MIN_SIZE = int(os.environ.get('SPAM_CLUSTER_MIN_SIZE', 3))
+DISCOUNT_SPAM_CLUSTERS = os.environ.get('DISCOUNT_SPAM_CLUSTERS', '0') == '1'
+
+def html_to_text(text):
+    # textDisplay のHTML（<br>、リンク、文字参照）をプレーンテキストに変換
+    text = re.sub(r'<br\s*/?>', '\n', text)
+    text = re.sub(r'<[^>]+>', '', text)
+    return html.unescape(text)
+
+def encode_comment_text(text):
+    data = text.encode('utf-8')
+    if len(data) >= COMMENT_COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(data, 9)
+        if len(compressed) < len(data):
+            return compressed
+    return text
+
+def decode_comment_text(value):
+    if isinstance(value, bytes):
+        return zlib.decompress(value).decode('utf-8')
+    return value
+
+def iso_to_epoch(value):
+    return calendar.timegm(datetime.strptime(value[:19], '%Y-%m-%dT%H:%M:%S').timetuple())
+
+def epoch_to_iso(value):
+    return datetime.utcfromtimestamp(value).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def iso_to_month_key(value):
+    # 'YYYY-MM-...' -> YYYYMM
+    return int(value[:4]) * 100 + int(value[5:7])
+
+def month_key_to_str(month_key):
+    return f"{month_key // 100:04d}-{month_key % 100:02d}"
+
+def connect_database(db_path):
+    # SLOW_QUERY_MS / PROFILE_REQUESTS の設定時はSQLごとの時間を計測する接続になる
+    conn = sqlite3.connect(db_path, timeout=30.0, factory=connection_factory())
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    conn.execute('PRAGMA temp_store=memory')
+    conn.execute('PRAGMA mmap_size=268435456')
+    # INSERT OR REPLACE による置換削除でも全文検索インデックスのトリガーを発火させる
+    conn.execute('PRAGMA recursive_triggers=ON')
+    # 圧縮されたコメント本文をSQL（全文検索トリガー、LIKE検索）から参照するための関数
+    conn.create_function('decompress_text', 1, decode_comment_text, deterministic=True)
+    return conn
+
+def connect_read_snapshot(snapshot_path):
+    # 公開後のスナップショットは置き換えられるだけで書き換えられないため、
+    # immutable=1 でロックと変更検知を省略して開く（取り込み中の書き込みを待たない）
+    uri = f"file:{quote(os.path.abspath(snapshot_path))}?mode=ro&immutable=1"
+    conn = sqlite3.connect(uri, uri=True, factory=connection_factory())
+    conn.execute('PRAGMA temp_store=memory')
+    conn.execute('PRAGMA mmap_size=268435456')
+    conn.create_function('decompress_text', 1, decode_comment_text, deterministic=True)
+    return conn
+
+# 取り込み側だけが使うテーブル（ダッシュボードからは読まないので、スナップショットには含めない）
+INGEST_ONLY_TABLES = ('analysis_jobs', 'analysis_events', 'analysis_leases', 'discovery_state', 'discovered_videos')
+
+def publish_read_snapshot(db_path, snapshot_path):
+    """本DBをバックアップAPIで一時ファイルに複製し、集計表を加えてから置き換える
+
+    os.replace による置き換えはアトミックなので、読み取り側は常に完全なスナップショットを開く。
+    既に開いている接続は置き換え前のファイルを読み続ける。
+    """
+    tmp_path = f"{snapshot_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    source = connect_database(db_path)
+    target = sqlite3.connect(tmp_path)
+    try:
+        source.backup(target)
+        source.close()
+        
+        # immutable=1 で開くため、WALではなく単一ファイルにする
+        target.execute('PRAGMA journal_mode=DELETE')
+        
+        for table in INGEST_ONLY_TABLES:
+            target.execute(f'DROP TABLE IF EXISTS {table}')
+        
+        # データベース管理画面の一覧用に動画ごとの件数を事前集計
+        target.executescript('''
+            CREATE TABLE video_summary (
+                video_id TEXT PRIMARY KEY,
+                comments_analyzed INTEGER,
+                snapshots_count INTEGER
+            ) WITHOUT ROWID;
+            
+            INSERT INTO video_summary (video_id, comments_analyzed, snapshots_count)
+            SELECT
+                v.id,
+                (SELECT COUNT(*) FROM comments c WHERE c.video_id = v.id)
+                    + (SELECT COUNT(*) FROM comment_duplicates d WHERE d.video_id = v.id),
+                (SELECT COUNT(*) FROM view_snapshots vs WHERE vs.video_id = v.id)
+            FROM videos v;
+            
+            CREATE TABLE snapshot_info (published_at TEXT);
+        ''')
+        target.execute(
+            'INSERT INTO snapshot_info (published_at) VALUES (?)',
+            (datetime.now().strftime('%Y年%m月%d日 %H:%M:%S'),)
+        )
+        target.commit()
+        target.close()
+        
+        os.replace(tmp_path, snapshot_path)
+    except Exception:
+        source.close()
+        target.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def read_snapshot_published_at(snapshot_path=READ_SNAPSHOT_PATH):
+    # 最終更新日時（公開済みスナップショットの公開日時）
+    if not READ_SNAPSHOT_ENABLED or not os.path.exists(snapshot_path):
+        return None
+    with connect_read_snapshot(snapshot_path) as conn:
+        row = conn.execute('SELECT published_at FROM snapshot_info').fetchone()
+    return row[0] if row else None
+
+def video_info_from_item(video_id, video):
+    # videos.list のレスポンスの1件を動画情報に変換
+    return {
+        'id': video_id,
+        'title': video['snippet']['title'],
+        'view_count': int(video['statistics'].get('viewCount', 0)),
+        'like_count': int(video['statistics'].get('likeCount', 0)),
+        'comment_count': int(video['statistics'].get('commentCount', 0)),
+        'published_at': video['snippet']['publishedAt']
+    }
+
+def create_schema(cursor):
+    # analyzed_at: コメントを最後に取得・分析した日時（統計だけの更新では変わらない）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS videos (
+            id TEXT PRIMARY KEY,
+            title TEXT,
+            view_count INTEGER,
+            like_count INTEGER,
+            comment_count INTEGER,
+            published_at TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            analyzed_at TEXT
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS view_snapshots (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            video_id TEXT,
+            view_count INTEGER,
+            like_count INTEGER,
+            comment_count INTEGER,
+            snapshot_date TEXT,
+            FOREIGN KEY (video_id) REFERENCES videos (id)
+        )
+    ''')
+    
+    # text: プレーンテキスト（長文はzlib圧縮したBLOB）
+    # sentiment: SENTIMENT_CODES の整数コード
+    # published_at: UTCのエポック秒、month_key: YYYYMM
+    # duplicate_count: このコメントを代表とする近似重複クラスターの件数（代表自身を含む）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS comments (
+            id TEXT PRIMARY KEY,
+            video_id TEXT,
+            text,
+            sentiment_score REAL,
+            sentiment INTEGER,
+            published_at INTEGER,
+            month_key INTEGER,
+            like_count INTEGER,
+            duplicate_count INTEGER DEFAULT 1,
+            FOREIGN KEY (video_id) REFERENCES videos (id)
+        )
+    ''')
+    
+    # 代表以外のクラスターのメンバー（本文は保存せず、感情は代表のものを使う）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS comment_duplicates (
+            id TEXT PRIMARY KEY,
+            video_id TEXT,
+            representative_id TEXT,
+            published_at INTEGER,
+            month_key INTEGER,
+            like_count INTEGER
+        ) WITHOUT ROWID
+    ''')
+    
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS monthly_stats (
+            video_id TEXT,
+            month_key INTEGER,
+            positive_comments INTEGER,
+            negative_comments INTEGER,
+            total_comments INTEGER,
+            avg_sentiment REAL,
+            PRIMARY KEY (video_id, month_key),
+            FOREIGN KEY (video_id) REFERENCES videos (id)
+        ) WITHOUT ROWID
+    ''')
+    
+    # 集計キャッシュ（analytics_cube）に差分反映すべき動画の記録（video_id が NULL の場合は全体）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analytics_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            video_id TEXT
+        )
+    ''')
+    
+    # 動画ごとの伸び率（スナップショット追加のたびに更新される1動画1行の集計）
+    # *_per_day: 直近2回のスナップショット間の1日あたり増加数
+    # *_7d / *_30d: 1日あたり増加数の時間加重移動平均（時定数7日・30日）
+    # acceleration: 短期平均が長期平均をどれだけ上回っているか
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS growth_metrics (
+            video_id TEXT PRIMARY KEY,
+            snapshot_at REAL,
+            view_count INTEGER,
+            like_count INTEGER,
+            comment_count INTEGER,
+            views_per_day REAL,
+            likes_per_day REAL,
+            comments_per_day REAL,
+            views_per_day_7d REAL,
+            views_per_day_30d REAL,
+            likes_per_day_7d REAL,
+            likes_per_day_30d REAL,
+            comments_per_day_7d REAL,
+            comments_per_day_30d REAL,
+            acceleration REAL,
+            intervals INTEGER DEFAULT 0
+        ) WITHOUT ROWID
+    ''')
+    
+    # 同じ動画の分析をワーカー間で1つにまとめるためのリース
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_leases (
+            video_id TEXT PRIMARY KEY,
+            owner TEXT,
+            expires_at REAL
+        )
+    ''')
+    
+    # 動画探索（再生リストの走査）の状態。全件走査済みのアップロード再生リストは差分だけ取得する
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS discovery_state (
+            playlist_id TEXT PRIMARY KEY,
+            last_full_scan_at TIMESTAMP
+        )
+    ''')
+    # 探索で見つかった動画（未分析のものも含め、以降の分析対象になる）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS discovered_videos (
+            video_id TEXT PRIMARY KEY,
+            playlist_id TEXT,
+            discovered_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            excluded_at TIMESTAMP
+        )
+    ''')
+    
+    # バックグラウンド分析ジョブと進捗イベント（SSEで配信）
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            id TEXT PRIMARY KEY,
+            kind TEXT,
+            status TEXT,
+            result TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            finished_at TIMESTAMP,
+            job_key TEXT,
+            heartbeat_at REAL
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS analysis_events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id TEXT,
+            event TEXT,
+            data TEXT
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_analysis_events_job ON analysis_events (job_id, seq)')
+    
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_view_snapshots_video_date ON view_snapshots (video_id, snapshot_date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_video_month ON comments (video_id, month_key)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_published_at ON comments (published_at)')
+    # 代表コメント（動画・感情ごとのいいね数上位）をソートなしで取り出すための索引
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_representative ON comments (video_id, sentiment, like_count DESC)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_comment_duplicates_video ON comment_duplicates (video_id, representative_id)')
+
+def add_missing_column(cursor, table, column, definition):
+    # 既存のDBに後から追加した列を足す（追加した場合はTrue）
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column in [row[1] for row in cursor.fetchall()]:
+        return False
+    cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+    return True
+
+def add_analyzed_at_column(cursor):
+    if add_missing_column(cursor, 'videos', 'analyzed_at', 'TEXT'):
+        # これまではスナップショットはすべて分析時に保存されていた
+        cursor.execute('''
+            UPDATE videos
+            SET analyzed_at = (SELECT MAX(snapshot_date) FROM view_snapshots vs WHERE vs.video_id = videos.id)
+        ''')
+
+def record_analytics_change(cursor, video_id):
+    cursor.execute('INSERT INTO analytics_changes (video_id) VALUES (?)', (video_id,))
+
+def prune_analytics_changes(cursor, retain=ANALYTICS_CHANGES_RETAIN):
+    # 統計の更新で毎回全動画分の行が増えるため、直近 retain 件だけを残す
+    # 最新の1件は必ず残す（空になるとキューブが削除による欠落を検知できない）
+    cursor.execute('''
+        DELETE FROM analytics_changes
+        WHERE seq <= (SELECT MAX(seq) FROM analytics_changes) - ?
+    ''', (max(retain, 1),))
+
+def insert_view_snapshot(cursor, video_info, now):
+    # スナップショットの追加と、それに伴う伸び率・集計キャッシュの更新
+    cursor.execute('''
+        INSERT INTO view_snapshots
+        (video_id, view_count, like_count, comment_count, snapshot_date)
+        VALUES (?, ?, ?, ?, ?)
+    ''', (
+        video_info['id'],
+        video_info['view_count'],
+        video_info['like_count'],
+        video_info['comment_count'],
+        now.strftime('%Y-%m-%d %H:%M:%S')
+    ))
+    update_growth_metrics(
+        cursor, video_info['id'], video_info['view_count'], video_info['like_count'],
+        video_info['comment_count'], now.timestamp()
+    )
+    record_analytics_change(cursor, video_info['id'])
+
+# 伸び率の移動平均の時定数（日）
+GROWTH_SHORT_DAYS = 7
+GROWTH_LONG_DAYS = 30
+# これより短い間隔のスナップショットでは伸び率を更新しない（次回は前回の基準から計算する）
+GROWTH_MIN_INTERVAL_DAYS = 1 / 24
+
+def moving_average(previous, rate, interval_days, time_constant_days):
+    # 間隔の長さに応じて重みを変える指数移動平均（履歴を保持せずに更新できる）
+    if previous is None:
+        return rate
+    weight = 1 - math.exp(-interval_days / time_constant_days)
+    return previous + weight * (rate - previous)
+
+def update_growth_metrics(cursor, video_id, view_count, like_count, comment_count, snapshot_at):
+    """スナップショット1件分だけ伸び率を更新する（snapshot_at はエポック秒）"""
+    counts = (view_count or 0, like_count or 0, comment_count or 0)
+    
+    cursor.execute('''
+        SELECT snapshot_at, view_count, like_count, comment_count,
+               views_per_day_7d, views_per_day_30d, likes_per_day_7d, likes_per_day_30d,
+               comments_per_day_7d, comments_per_day_30d, intervals
+        FROM growth_metrics
+        WHERE video_id = ?
+    ''', (video_id,))
+    row = cursor.fetchone()
+    
+    if row is None:
+        # 最初のスナップショットは基準値のみ
+        cursor.execute('''
+            INSERT INTO growth_metrics (video_id, snapshot_at, view_count, like_count, comment_count)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (video_id, snapshot_at, *counts))
+        return
+    
+    interval_days = (snapshot_at - row[0]) / 86400
+    if interval_days < GROWTH_MIN_INTERVAL_DAYS:
+        return
+    
+    rates = [(count - (previous or 0)) / interval_days for count, previous in zip(counts, row[1:4])]
+    averages = []
+    for rate, (short, long) in zip(rates, [row[4:6], row[6:8], row[8:10]]):
+        averages.append(moving_average(short, rate, interval_days, GROWTH_SHORT_DAYS))
+        averages.append(moving_average(long, rate, interval_days, GROWTH_LONG_DAYS))
+    
+    # 再生数の短期平均と長期平均の差を長期平均で割った値（+1で再生の少ない動画の振れを抑える）
+    acceleration = (averages[0] - averages[1]) / (abs(averages[1]) + 1)
+    
+    cursor.execute('''
+        UPDATE growth_metrics
+        SET snapshot_at = ?, view_count = ?, like_count = ?, comment_count = ?,
+            views_per_day = ?, likes_per_day = ?, comments_per_day = ?,
+            views_per_day_7d = ?, views_per_day_30d = ?, likes_per_day_7d = ?, likes_per_day_30d = ?,
+            comments_per_day_7d = ?, comments_per_day_30d = ?,
+            acceleration = ?, intervals = intervals + 1
+        WHERE video_id = ?
+    ''', (snapshot_at, *counts, *rates, *averages, acceleration, video_id))
+
+def rebuild_growth_metrics(cursor):
+    # 既存のスナップショット履歴を古い順に再生して伸び率を作り直す（テーブル追加時の一度だけ）
+    cursor.execute('DELETE FROM growth_metrics')
+    cursor.execute('''
+        SELECT video_id, view_count, like_count, comment_count, snapshot_date
+        FROM view_snapshots
+        ORDER BY video_id, snapshot_date, id
+    ''')
+    for video_id, view_count, like_count, comment_count, snapshot_date in cursor.fetchall():
+        snapshot_at = datetime.strptime(snapshot_date[:19], '%Y-%m-%d %H:%M:%S').timestamp()
+        update_growth_metrics(cursor, video_id, view_count, like_count, comment_count, snapshot_at)
+
+def query_representative_comments(cursor, video_ids, limit):
+    """動画 × 感情ごとに、いいね数（同数なら本文の長さ）の上位 limit 件のコメントを返す
+
+    (動画, 感情) ごとに索引から limit 番目のいいね数を引き、それ以上のコメント（同数の境界も含む）
+    だけを候補にして順位を付ける。本文の展開と並べ替えは候補だけに行う。
+    """
+    representative = {
+        video_id: {'positive': [], 'negative': [], 'neutral': []}
+        for video_id in video_ids
+    }
+    if not representative:
+        return representative
+    
+    cursor.execute('''
+        WITH targets AS (
+            SELECT v.value AS video_id, s.value AS sentiment
+            FROM json_each(?) v, json_each(?) s
+        ),
+        -- 先に (動画, 感情) ごとの閾値を確定させ、コメントは閾値以上の範囲だけを索引で読む
+        thresholds AS MATERIALIZED (
+            SELECT
+                video_id,
+                sentiment,
+                COALESCE((
+                    SELECT like_count
+                    FROM comments c
+                    WHERE c.video_id = t.video_id AND c.sentiment = t.sentiment
+                    ORDER BY like_count DESC
+                    LIMIT 1 OFFSET ?
+                ), -1) AS min_like_count
+            FROM targets t
+        )
+        SELECT video_id, sentiment, text, like_count, sentiment_score, published_at, duplicate_count
+        FROM (
+            SELECT
+                c.video_id, c.sentiment, c.text, c.like_count, c.sentiment_score, c.published_at, c.duplicate_count,
+                ROW_NUMBER() OVER (
+                    PARTITION BY c.video_id, c.sentiment
+                    ORDER BY c.like_count DESC, LENGTH(decompress_text(c.text)) DESC
+                ) AS position
+            FROM thresholds t
+            JOIN comments c
+                ON c.video_id = t.video_id
+                AND c.sentiment = t.sentiment
+                AND c.like_count >= t.min_like_count
+        )
+        WHERE position <= ?
+        ORDER BY video_id, sentiment, position
+    ''', (json.dumps(list(representative)), json.dumps(list(SENTIMENT_LABELS)), limit - 1, limit))
+    
+    for video_id, sentiment, text, like_count, sentiment_score, published_at, duplicate_count in cursor.fetchall():
+        representative[video_id][SENTIMENT_LABELS[sentiment]].append({
+            'text': decode_comment_text(text),
+            'like_count': like_count,
+            'sentiment_score': sentiment_score,
+            'published_at': epoch_to_iso(published_at),
+            'duplicate_count': duplicate_count
+        })
+    
+    return representative
+
+def store_comment_clusters(cursor, video_id, comments_with_sentiment):
+    """近似重複クラスターの代表だけを本文付きで保存し、他のメンバーはIDと日時だけを記録する
+
+    取得範囲は分析のたびに変わるため、duplicate_count は今回の取得件数ではなく、
+    保存済みのメンバー数から数え直す。
+    """
+    representatives = []
+    duplicates = []
+    for comment in comments_with_sentiment:
+        if comment.get('representative_id', comment['id']) == comment['id']:
+            representatives.append(comment)
+        else:
+            duplicates.append(comment)
+    
+    # 再分析で代表とメンバーが入れ替わることがあるので、今回取得したコメントの前回の記録は消しておく
+    cursor.executemany('DELETE FROM comment_duplicates WHERE id = ?', [(c['id'],) for c in comments_with_sentiment])
+    # 代表からメンバーに変わったコメントの（今回は取得されなかった）メンバーは、新しい代表に付け替える
+    cursor.executemany(
+        'UPDATE comment_duplicates SET representative_id = ? WHERE representative_id = ?',
+        [(c['representative_id'], c['id']) for c in duplicates]
+    )
+    cursor.executemany('DELETE FROM comments WHERE id = ?', [(c['id'],) for c in duplicates])
+    
+    cursor.executemany('''
+        INSERT OR REPLACE INTO comments
+        (id, video_id, text, sentiment_score, sentiment, published_at, month_key, like_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [
+        (
+            comment['id'],
+            video_id,
+            encode_comment_text(comment['text']),
+            comment['sentiment_score'],
+            SENTIMENT_CODES[comment['sentiment_label']],
+            iso_to_epoch(comment['published_at']),
+            iso_to_month_key(comment['published_at']),
+            comment['like_count']
+        ) for comment in representatives
+    ])
+    
+    cursor.executemany('''
+        INSERT INTO comment_duplicates
+        (id, video_id, representative_id, published_at, month_key, like_count)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [
+        (
+            comment['id'],
+            video_id,
+            comment['representative_id'],
+            iso_to_epoch(comment['published_at']),
+            iso_to_month_key(comment['published_at']),
+            comment['like_count']
+        ) for comment in duplicates
+    ])
+    
+    cursor.execute('''
+        UPDATE comments
+        SET duplicate_count = 1 + (
+            SELECT COUNT(*)
+            FROM comment_duplicates d
+            WHERE d.video_id = comments.video_id AND d.representative_id = comments.id
+        )
+        WHERE video_id = ?
+    ''', (video_id,))
+
+def create_comment_search_index(cursor):
+    # コメント本文の全文検索インデックス（trigramなので日本語も形態素解析なしで検索可能）
+    # 本文は圧縮されている場合があるため、解凍したテキストを保持しないcontentlessテーブルに登録する
+    cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(
+            text,
+            content='',
+            tokenize='trigram'
+        )
+    ''')
+    
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS comments_fts_insert AFTER INSERT ON comments BEGIN
+            INSERT INTO comments_fts (rowid, text) VALUES (new.rowid, decompress_text(new.text));
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS comments_fts_delete AFTER DELETE ON comments BEGIN
+            INSERT INTO comments_fts (comments_fts, rowid, text) VALUES ('delete', old.rowid, decompress_text(old.text));
+        END
+    ''')
+    cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS comments_fts_update AFTER UPDATE OF text ON comments BEGIN
+            INSERT INTO comments_fts (comments_fts, rowid, text) VALUES ('delete', old.rowid, decompress_text(old.text));
+            INSERT INTO comments_fts (rowid, text) VALUES (new.rowid, decompress_text(new.text));
+        END
+    ''')
+
+def migrate_schema_v2(conn, batch_size=10000):
+    """v1スキーマ（TEXTラベル・ISO日時・HTML本文）のDBをv2スキーマへ移行"""
+    cursor = conn.cursor()
+    # 途中で失敗しても旧スキーマのまま残るよう、1トランザクションで移行する
+    if not conn.in_transaction:
+        cursor.execute('BEGIN')
+    
+    cursor.execute('DROP TRIGGER IF EXISTS comments_fts_insert')
+    cursor.execute('DROP TRIGGER IF EXISTS comments_fts_delete')
+    cursor.execute('DROP TRIGGER IF EXISTS comments_fts_update')
+    cursor.execute('DROP TABLE IF EXISTS comments_fts')
+    cursor.execute('DROP INDEX IF EXISTS idx_comments_video_id')
+    cursor.execute('ALTER TABLE comments RENAME TO comments_v1')
+    cursor.execute('ALTER TABLE monthly_stats RENAME TO monthly_stats_v1')
+    
+    create_schema(cursor)
+    # videos は作り直さないので、v1 にない列をここで追加する
+    add_analyzed_at_column(cursor)
+    
+    read_cursor = conn.cursor()
+    read_cursor.execute('''
+        SELECT id, video_id, text, sentiment_score, sentiment_label, published_at, like_count
+        FROM comments_v1
+    ''')
+    while True:
+        rows = read_cursor.fetchmany(batch_size)
+        if not rows:
+            break
+        cursor.executemany('''
+            INSERT OR REPLACE INTO comments
+            (id, video_id, text, sentiment_score, sentiment, published_at, month_key, like_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', [
+            (
+                comment_id,
+                video_id,
+                encode_comment_text(html_to_text(text or '')),
+                sentiment_score,
+                SENTIMENT_CODES.get(sentiment_label, 0),
+                iso_to_epoch(published_at),
+                iso_to_month_key(published_at),
+                like_count
+            ) for comment_id, video_id, text, sentiment_score, sentiment_label, published_at, like_count in rows
+        ])
+    
+    cursor.execute('''
+        INSERT OR REPLACE INTO monthly_stats
+        (video_id, month_key, positive_comments, negative_comments, total_comments, avg_sentiment)
+        SELECT
+            video_id,
+            CAST(substr(month, 1, 4) AS INTEGER) * 100 + CAST(substr(month, 6, 2) AS INTEGER),
+            positive_comments,
+            negative_comments,
+            total_comments,
+            avg_sentiment
+        FROM monthly_stats_v1
+        WHERE month IS NOT NULL
+    ''')
+    
+    cursor.execute('DROP TABLE comments_v1')
+    cursor.execute('DROP TABLE monthly_stats_v1')
+    
+    create_comment_search_index(cursor)
+    cursor.execute('INSERT INTO comments_fts (rowid, text) SELECT rowid, decompress_text(text) FROM comments')
+    
+    cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+class VideoNotFoundError(ValueError):
+    """YouTube上で動画が見つからない（削除・非公開）"""
+
+class AnalysisFlight:
+    """同じプロセス内で実行中の動画分析（後続のリクエストはこの結果を待つ）"""
+    
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+# バックグラウンドで公開中のスナップショット（DBごと。値は公開中に次の公開を要求されたか）
+_background_publishes = {}
+_background_publishes_lock = threading.Lock()
+
+# スキーマの作成・移行を済ませたDB（リクエストごとのアナライザー生成で繰り返さない）
+_initialized_databases = set()
+_initialized_databases_lock = threading.Lock()
+
 class YouTubeAnalyzer:
     def __init__(self):
         self.api_key = os.environ.get('YOUTUBE_API_KEY')
@@ -20,70 +721,118 @@ class YouTubeAnalyzer:
             raise ValueError("YouTube API key not found. Please set YOUTUBE_API_KEY environment variable.")
         
         self.youtube = build('youtube', 'v3', developerKey=self.api_key)
-        self.db_path = 'youtube_analysis.db'
+        self.sentiment_backend = get_backend()
+        self.db_path = DB_PATH
+        self.snapshot_path = READ_SNAPSHOT_PATH
+        # 進捗の通知先（progress_callback(event, **data)）。analysis_jobs から設定される
+        self.progress_callback = None
         self.init_database()
     
     def get_db_connection(self):
-        conn = sqlite3.connect(self.db_path, timeout=30.0)
-        conn.execute('PRAGMA journal_mode=WAL')
-        conn.execute('PRAGMA synchronous=NORMAL')
-        conn.execute('PRAGMA temp_store=memory')
-        conn.execute('PRAGMA mmap_size=268435456')
-        return conn
+        return connect_database(self.db_path)
+    
+    def has_read_snapshot(self):
+        return READ_SNAPSHOT_ENABLED and os.path.exists(self.snapshot_path)
+    
+    def get_read_connection(self):
+        # ダッシュボードの読み取りは公開済みスナップショットから（未公開なら本DB）
+        if self.has_read_snapshot():
+            return connect_read_snapshot(self.snapshot_path)
+        return self.get_db_connection()
+    
+    def publish_read_snapshot(self):
+        try:
+            # スナップショットに複製する前に、古い変更記録を削除（直近 ANALYTICS_CHANGES_RETAIN 件だけ残す）
+            with self.get_db_connection() as conn:
+                prune_analytics_changes(conn.cursor())
+                conn.commit()
+            
+            if not READ_SNAPSHOT_ENABLED:
+                return False
+            
+            start = time.perf_counter()
+            publish_read_snapshot(self.db_path, self.snapshot_path)
+            self.publish_dashboard()
+            print(f"読み取り用スナップショットを公開しました ({time.perf_counter() - start:.2f}秒)")
+            return True
+        except Exception as e:
+            # 公開に失敗しても分析結果は本DBに保存済みなので、取り込みは続ける
+            print(f"スナップショットの公開でエラー: {str(e)}")
+            return False
+    
+    def request_read_snapshot_publish(self):
+        """個別分析・削除の後のスナップショット公開を、リクエストを待たせずバックグラウンドで行う
+
+        公開中に届いた要求は、その公開の完了後に1回だけまとめて公開し直す。
+        """
+        if not READ_SNAPSHOT_ENABLED:
+            # 変更記録の削除だけなので、その場で行う
+            self.publish_read_snapshot()
+            return
+        
+        with _background_publishes_lock:
+            if self.db_path in _background_publishes:
+                _background_publishes[self.db_path] = True
+                return
+            _background_publishes[self.db_path] = False
+        
+        threading.Thread(target=self.publish_in_background, daemon=True).start()
+    
+    def publish_in_background(self):
+        while True:
+            self.publish_read_snapshot()
+            with _background_publishes_lock:
+                if not _background_publishes[self.db_path]:
+                    del _background_publishes[self.db_path]
+                    return
+                _background_publishes[self.db_path] = False
+    
+    def report_progress(self, event, **data):
+        if self.progress_callback:
+            self.progress_callback(event, **data)
     
     def init_database(self):
+        with _initialized_databases_lock:
+            if self.db_path in _initialized_databases:
+                return
+            self.create_or_migrate_schema()
+            _initialized_databases.add(self.db_path)
+    
+    def create_or_migrate_schema(self):
+        if (not os.path.exists(self.db_path) and os.path.exists(LEGACY_DB_PATH)
+                and os.path.abspath(self.db_path) != os.path.abspath(LEGACY_DB_PATH)):
+            print(
+                f"警告: {self.db_path} が存在しないため空のデータベースを作成します。"
+                f"以前のデータ（{os.path.abspath(LEGACY_DB_PATH)}）を使う場合は DB_PATH の場所へ移動してください"
+            )
+        
         with self.get_db_connection() as conn:
             cursor = conn.cursor()
             
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS videos (
-                    id TEXT PRIMARY KEY,
-                    title TEXT,
-                    view_count INTEGER,
-                    like_count INTEGER,
-                    comment_count INTEGER,
-                    published_at TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
+            cursor.execute('PRAGMA user_version')
+            version = cursor.fetchone()[0]
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'comments'")
+            has_comments = cursor.fetchone() is not None
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'growth_metrics'")
+            has_growth_metrics = cursor.fetchone() is not None
             
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS view_snapshots (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    video_id TEXT,
-                    view_count INTEGER,
-                    like_count INTEGER,
-                    comment_count INTEGER,
-                    snapshot_date TEXT,
-                    FOREIGN KEY (video_id) REFERENCES videos (id)
-                )
-            ''')
+            if version < SCHEMA_VERSION and has_comments:
+                # 旧スキーマのDBは起動時に移行（計測付きで移行する場合は migrate_db.py を使用）
+                print("データベースをスキーマv2へ移行します...")
+                migrate_schema_v2(conn)
+            else:
+                create_schema(cursor)
+                create_comment_search_index(cursor)
+                cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
             
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS comments (
-                    id TEXT PRIMARY KEY,
-                    video_id TEXT,
-                    text TEXT,
-                    sentiment_score REAL,
-                    sentiment_label TEXT,
-                    published_at TEXT,
-                    like_count INTEGER,
-                    FOREIGN KEY (video_id) REFERENCES videos (id)
-                )
-            ''')
+            if not has_growth_metrics:
+                rebuild_growth_metrics(cursor)
             
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS monthly_stats (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    video_id TEXT,
-                    month TEXT,
-                    positive_comments INTEGER,
-                    negative_comments INTEGER,
-                    total_comments INTEGER,
-                    avg_sentiment REAL,
-                    FOREIGN KEY (video_id) REFERENCES videos (id)
-                )
-            ''')
+            add_missing_column(cursor, 'comments', 'duplicate_count', 'INTEGER DEFAULT 1')
+            add_missing_column(cursor, 'discovered_videos', 'excluded_at', 'TIMESTAMP')
+            add_missing_column(cursor, 'analysis_jobs', 'job_key', 'TEXT')
+            add_missing_column(cursor, 'analysis_jobs', 'heartbeat_at', 'REAL')
+            add_analyzed_at_column(cursor)
             
             conn.commit()
     
@@ -116,17 +865,24 @@ class YouTubeAnalyzer:
         response = request.execute()
         
         if not response['items']:
-            raise ValueError("Video not found")
+            raise VideoNotFoundError("Video not found")
         
-        video = response['items'][0]
-        return {
-            'id': video_id,
-            'title': video['snippet']['title'],
-            'view_count': int(video['statistics'].get('viewCount', 0)),
-            'like_count': int(video['statistics'].get('likeCount', 0)),
-            'comment_count': int(video['statistics'].get('commentCount', 0)),
-            'published_at': video['snippet']['publishedAt']
-        }
+        return video_info_from_item(video_id, response['items'][0])
+    
+    def get_videos_info(self, video_ids):
+        """videos.list を最大50件ずつまとめて呼び出し、{動画ID: 動画情報} を返す（削除・非公開の動画は含まれない）"""
+        videos = {}
+        for start in range(0, len(video_ids), VIDEOS_LIST_BATCH_SIZE):
+            batch = video_ids[start:start + VIDEOS_LIST_BATCH_SIZE]
+            response = self.youtube.videos().list(
+                part='snippet,statistics',
+                id=','.join(batch),
+                maxResults=VIDEOS_LIST_BATCH_SIZE
+            ).execute()
+            
+            for video in response['items']:
+                videos[video['id']] = video_info_from_item(video['id'], video)
+        return videos
     
     def get_video_comments(self, video_id, max_results=2000):
         comments = []
@@ -134,6 +890,7 @@ class YouTubeAnalyzer:
         
         try:
             # 時系列順で取得を試行
+            pages_fetched = 0
             for order_type in ['time', 'relevance']:
                 temp_comments = []
                 temp_next_page_token = None
@@ -152,7 +909,7 @@ class YouTubeAnalyzer:
                         comment = item['snippet']['topLevelComment']['snippet']
                         comment_data = {
                             'id': item['id'],
-                            'text': comment['textDisplay'],
+                            'text': html_to_text(comment['textDisplay']),
                             'published_at': comment['publishedAt'],
                             'like_count': comment.get('likeCount', 0)
                         }
@@ -161,6 +918,9 @@ class YouTubeAnalyzer:
                         if not any(c['id'] == comment_data['id'] for c in temp_comments):
                             temp_comments.append(comment_data)
                     
+                    pages_fetched += 1
+                    self.report_progress('page', video_id=video_id, pages=pages_fetched, comments=len(temp_comments))
+                    
                     temp_next_page_token = response.get('nextPageToken')
                     if not temp_next_page_token or len(temp_comments) >= max_results:
                         break
@@ -197,205 +957,173 @@ class YouTubeAnalyzer:
         return unique_comments
     
     def analyze_sentiment(self, text):
-        blob = TextBlob(text)
-        polarity = blob.sentiment.polarity
-        
-        # より慎重な感情分析（バランス重視）
-        if polarity > 0.05:
-            label = 'positive'
-        elif polarity < -0.05:
-            label = 'negative'
-        else:
-            label = 'neutral'
-        
-        # より厳密に分類された感情キーワード
-        strong_positive_keywords = [
-            '最高', '素晴らしい', '神', '感動', '大好き', '愛してる', 'すげー', 'すげえ', 'やばい', 'ヤバい', 
-            'amazing', 'awesome', 'love', 'perfect', '完璧', '天才', 'かっこいい', 'イケメン', '美しい'
-        ]
-        
-        positive_keywords = [
-            '好き', 'いい', '良い', 'すごい', '面白い', '楽しい', 'ありがとう', '可愛い', 'かわいい', 
-            '素敵', '感謝', '嬉しい', 'うれしい', '笑', 'ナイス', 'nice', 'good', 'great', 'cool'
-        ]
-        
-        strong_negative_keywords = [
-            '最悪', '死ね', 'クソ', 'くそ', 'ゴミ', 'きもい', 'うざい', 'ムカつく', 'イライラ',
-            'hate', 'terrible', 'awful', 'worst', 'stupid', '大嫌い', 'ひどい', '腹立つ'
-        ]
-        
-        negative_keywords = [
-            '嫌い', '悪い', 'つまらない', '退屈', '残念', 'がっかり', 'だめ', 'ダメ', '悲しい',
-            'bad', 'boring', 'disappointed'
-        ]
-        
-        # ネガティブではない一般的な表現を除外
-        neutral_expressions = [
-            '思う', '思った', '感じ', '感じる', '考え', '見る', '聞く', '言う', '話', '時間', 
-            '今日', '明日', '昨日', '最近', '前', '後', '中', '上', '下', '右', '左'
-        ]
-        
-        text_clean = text.lower().replace(' ', '').replace('　', '')
-        
-        # 強いキーワードのチェック
-        strong_positive_count = sum(1 for word in strong_positive_keywords if word in text_clean)
-        strong_negative_count = sum(1 for word in strong_negative_keywords if word in text_clean)
-        
-        # 通常のキーワードのチェック
-        positive_count = sum(1 for word in positive_keywords if word in text_clean)
-        negative_count = sum(1 for word in negative_keywords if word in text_clean)
-        
-        # ニュートラル表現のチェック
-        neutral_count = sum(1 for word in neutral_expressions if word in text_clean)
-        
-        # 強いキーワードが優先
-        if strong_positive_count > 0 and strong_negative_count == 0:
-            label = 'positive'
-            polarity = max(polarity, 0.3)
-        elif strong_negative_count > 0 and strong_positive_count == 0:
-            label = 'negative'
-            polarity = min(polarity, -0.3)
-        elif strong_positive_count > 0 and strong_negative_count > 0:
-            # 両方ある場合は多い方
-            if strong_positive_count > strong_negative_count:
-                label = 'positive'
-                polarity = max(polarity, 0.2)
-            else:
-                label = 'negative'
-                polarity = min(polarity, -0.2)
-        else:
-            # 通常のキーワードでの判定
-            total_positive = positive_count
-            total_negative = negative_count
-            
-            # ニュートラル表現が多い場合は感情を弱める
-            if neutral_count > 2:
-                total_positive *= 0.5
-                total_negative *= 0.5
-            
-            if total_positive > total_negative and total_positive > 0:
-                if polarity >= -0.1:  # あまりにネガティブでなければ
-                    label = 'positive'
-                    polarity = max(polarity, 0.1)
-            elif total_negative > total_positive and total_negative > 0:
-                if polarity <= 0.1:  # あまりにポジティブでなければ
-                    label = 'negative'
-                    polarity = min(polarity, -0.1)
-            else:
-                # キーワードが同数または無い場合、元のpolarityを尊重
-                if polarity > 0.02:
-                    label = 'positive'
-                elif polarity < -0.02:
-                    label = 'negative'
-                else:
-                    label = 'neutral'
-        
-        return polarity, label
+        return self.sentiment_backend.analyze(text)
     
     def save_video_data(self, video_info, comments_with_sentiment):
+        """動画とコメントを保存し、分析日時（videos.analyzed_at）を返す"""
+        analyzed_at = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         with self.get_db_connection() as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
                 INSERT OR REPLACE INTO videos 
-                (id, title, view_count, like_count, comment_count, published_at)
-                VALUES (?, ?, ?, ?, ?, ?)
+                (id, title, view_count, like_count, comment_count, published_at, analyzed_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
             ''', (
                 video_info['id'],
                 video_info['title'],
                 video_info['view_count'],
                 video_info['like_count'],
                 video_info['comment_count'],
-                video_info['published_at']
+                video_info['published_at'],
+                analyzed_at
             ))
             
-            for comment in comments_with_sentiment:
-                cursor.execute('''
-                    INSERT OR REPLACE INTO comments
-                    (id, video_id, text, sentiment_score, sentiment_label, published_at, like_count)
-                    VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    comment['id'],
-                    video_info['id'],
-                    comment['text'],
-                    comment['sentiment_score'],
-                    comment['sentiment_label'],
-                    comment['published_at'],
-                    comment['like_count']
-                ))
+            store_comment_clusters(cursor, video_info['id'], comments_with_sentiment)
+            
+            # 削除後に改めて分析された動画は分析対象に戻す
+            cursor.execute('UPDATE discovered_videos SET excluded_at = NULL WHERE video_id = ?', (video_info['id'],))
             
             conn.commit()
         
         self.save_view_snapshot(video_info)
         self.update_monthly_stats(video_info['id'])
+        return analyzed_at
     
     def save_view_snapshot(self, video_info):
-        from datetime import datetime
+        with self.get_db_connection() as conn:
+            insert_view_snapshot(conn.cursor(), video_info, datetime.now())
+            conn.commit()
+    
+    def refresh_video_stats(self):
+        """コメントは取得せず、登録済みの全動画の再生数・高評価数・コメント数を更新してスナップショットを追加する"""
+        with self.get_db_connection() as conn:
+            video_ids = [row[0] for row in conn.execute('SELECT id FROM videos ORDER BY id').fetchall()]
+        
+        if not video_ids:
+            return {'success': True, 'refreshed': 0, 'missing': 0, 'api_calls': 0, 'message': '登録済みの動画がありません'}
+        
+        videos = self.get_videos_info(video_ids)
+        now = datetime.now()
+        refreshed = 0
         
         with self.get_db_connection() as conn:
             cursor = conn.cursor()
-            
-            current_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            
-            cursor.execute('''
-                INSERT INTO view_snapshots
-                (video_id, view_count, like_count, comment_count, snapshot_date)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                video_info['id'],
-                video_info['view_count'],
-                video_info['like_count'],
-                video_info['comment_count'],
-                current_date
-            ))
+            for video_info in videos.values():
+                cursor.execute('''
+                    UPDATE videos
+                    SET title = ?, view_count = ?, like_count = ?, comment_count = ?
+                    WHERE id = ?
+                ''', (
+                    video_info['title'],
+                    video_info['view_count'],
+                    video_info['like_count'],
+                    video_info['comment_count'],
+                    video_info['id']
+                ))
+                if cursor.rowcount == 0:
+                    # 取得中に削除された動画
+                    continue
+                insert_view_snapshot(cursor, video_info, now)
+                refreshed += 1
             
             conn.commit()
+        
+        self.publish_read_snapshot()
+        
+        missing = len(video_ids) - len(videos)
+        print(f"統計を更新しました: {refreshed}件 (取得できなかった動画: {missing}件)")
+        return {
+            'success': True,
+            'refreshed': refreshed,
+            'missing': missing,
+            'api_calls': math.ceil(len(video_ids) / VIDEOS_LIST_BATCH_SIZE)
+        }
     
     def update_monthly_stats(self, video_id):
         with self.get_db_connection() as conn:
             cursor = conn.cursor()
             
+            # 重複コメントは投稿月ごとに代表の感情で数える（スパムを割り引く場合、大きなクラスターは代表の1件だけ）
+            max_cluster_size = SPAM_CLUSTER_MIN_SIZE if DISCOUNT_SPAM_CLUSTERS else None
             cursor.execute('''
                 SELECT 
-                    strftime('%Y-%m', published_at) as month,
+                    month_key,
                     COUNT(*) as total_comments,
-                    SUM(CASE WHEN sentiment_label = 'positive' THEN 1 ELSE 0 END) as positive_comments,
-                    SUM(CASE WHEN sentiment_label = 'negative' THEN 1 ELSE 0 END) as negative_comments,
+                    SUM(sentiment = 1) as positive_comments,
+                    SUM(sentiment = -1) as negative_comments,
                     AVG(sentiment_score) as avg_sentiment
-                FROM comments
-                WHERE video_id = ?
-                GROUP BY strftime('%Y-%m', published_at)
-            ''', (video_id,))
+                FROM (
+                    SELECT month_key, sentiment, sentiment_score
+                    FROM comments
+                    WHERE video_id = ?
+                    UNION ALL
+                    SELECT d.month_key, c.sentiment, c.sentiment_score
+                    FROM comment_duplicates d
+                    JOIN comments c ON c.id = d.representative_id
+                    WHERE d.video_id = ? AND (? IS NULL OR c.duplicate_count < ?)
+                )
+                GROUP BY month_key
+            ''', (video_id, video_id, max_cluster_size, max_cluster_size))
             
             monthly_data = cursor.fetchall()
             
             cursor.execute('DELETE FROM monthly_stats WHERE video_id = ?', (video_id,))
             
-            for month, total, positive, negative, avg_sentiment in monthly_data:
-                cursor.execute('''
-                    INSERT INTO monthly_stats
-                    (video_id, month, positive_comments, negative_comments, total_comments, avg_sentiment)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (video_id, month, positive, negative, total, avg_sentiment))
+            cursor.executemany('''
+                INSERT INTO monthly_stats
+                (video_id, month_key, positive_comments, negative_comments, total_comments, avg_sentiment)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [
+                (video_id, month_key, positive, negative, total, avg_sentiment)
+                for month_key, total, positive, negative, avg_sentiment in monthly_data
+            ])
+            record_analytics_change(cursor, video_id)
             
             conn.commit()
     
+    def cluster_comments(self, comments):
+        """コメントを近似重複クラスター（先頭が代表）のリストにまとめる"""
+        if not NEAR_DUPLICATE_DETECTION:
+            return [[comment] for comment in comments]
+        
+        clusters = cluster_near_duplicates([comment['text'] for comment in comments])
+        # 代表はいいね数が最も多い（同数なら最も古い）コメント
+        return [
+            sorted((comments[i] for i in members), key=lambda c: (-c['like_count'], c['published_at']))
+            for members in clusters
+        ]
+    
     def analyze_video(self, video_url):
         video_id = self.extract_video_id(video_url)
         video_info = self.get_video_info(video_id)
         comments = self.get_video_comments(video_id)
+        clusters = self.cluster_comments(comments)
         
         comments_with_sentiment = []
         sentiment_summary = {'positive': 0, 'negative': 0, 'neutral': 0}
         
-        for comment in comments:
-            sentiment_score, sentiment_label = self.analyze_sentiment(comment['text'])
-            comment['sentiment_score'] = sentiment_score
-            comment['sentiment_label'] = sentiment_label
-            comments_with_sentiment.append(comment)
-            sentiment_summary[sentiment_label] += 1
+        # 感情分析はクラスターの代表だけに行い、同じ結果をメンバー全員に付ける
+        for members in clusters:
+            representative = members[0]
+            sentiment_score, sentiment_label = self.analyze_sentiment(representative['text'])
+            for comment in members:
+                comment['representative_id'] = representative['id']
+                comment['sentiment_score'] = sentiment_score
+                comment['sentiment_label'] = sentiment_label
+                comments_with_sentiment.append(comment)
+            sentiment_summary[sentiment_label] += len(members)
+        
+        duplicate_comments = len(comments_with_sentiment) - len(clusters)
+        if duplicate_comments:
+            print(f"近似重複コメント: {duplicate_comments}件（{len(clusters)}クラスターの代表のみ分析）")
+        
+        self.report_progress(
+            'scored', video_id=video_id, comments=len(comments_with_sentiment),
+            clusters=len(clusters), summary=sentiment_summary
+        )
         
-        self.save_video_data(video_info, comments_with_sentiment)
+        analyzed_at = self.save_video_data(video_info, comments_with_sentiment)
         
         # 代表コメント取得
         representative_comments = self.get_representative_comments(video_info['id'])
@@ -404,91 +1132,256 @@ class YouTubeAnalyzer:
             'video_info': video_info,
             'sentiment_summary': sentiment_summary,
             'total_comments_analyzed': len(comments_with_sentiment),
+            'duplicate_comments': duplicate_comments,
             'representative_comments': representative_comments,
-            'analysis_complete': True
+            'analysis_complete': True,
+            'cached': False,
+            'analyzed_at': analyzed_at
         }
     
-    def get_monthly_rankings(self):
+    def get_analytics_cube(self):
+        # スナップショットの analytics_changes も本DBと同じ連番なので、差分同期はそのまま使える
+        cube = get_cube(self.snapshot_path if self.has_read_snapshot() else self.db_path)
+        with self.get_read_connection() as conn:
+            with cube.lock:
+                cube.sync(conn)
+        return cube
+    
+    def parse_month_filter(self, month_str):
+        # 'YYYY-MM' -> YYYYMM（未指定ならNone）
+        if not month_str:
+            return None
+        try:
+            return iso_to_month_key(month_str)
+        except ValueError:
+            raise ValueError('月はYYYY-MM形式で指定してください')
+    
+    def get_fresh_analysis(self, video_id, ttl_minutes):
+        # 最終分析がTTL以内なら、DBの内容から分析結果を組み立てる
         with self.get_db_connection() as conn:
             cursor = conn.cursor()
             
+            # 統計だけの更新（refresh_video_stats）ではコメントは再分析されないので、分析日時で判定する
             cursor.execute('''
-                SELECT 
-                    v.title,
-                    ms.month,
-                    ms.negative_comments,
-                    ms.positive_comments,
-                    ms.total_comments
-                FROM monthly_stats ms
-                JOIN videos v ON ms.video_id = v.id
-                ORDER BY ms.negative_comments DESC
-                LIMIT 10
-            ''')
-            top_negative = cursor.fetchall()
+                SELECT title, view_count, like_count, comment_count, published_at, analyzed_at
+                FROM videos
+                WHERE id = ?
+            ''', (video_id,))
+            row = cursor.fetchone()
             
-            cursor.execute('''
-                SELECT 
-                    v.title,
-                    ms.month,
-                    ms.positive_comments,
-                    ms.negative_comments,
-                    ms.total_comments
-                FROM monthly_stats ms
-                JOIN videos v ON ms.video_id = v.id
-                ORDER BY ms.positive_comments DESC
-                LIMIT 10
-            ''')
-            top_positive = cursor.fetchall()
+            if row is None or row[5] is None:
+                return None
             
+            analyzed_at = datetime.strptime(row[5], '%Y-%m-%d %H:%M:%S')
+            if datetime.now() - analyzed_at > timedelta(minutes=ttl_minutes):
+                return None
+            
+            cursor.execute('SELECT sentiment, SUM(duplicate_count) FROM comments WHERE video_id = ? GROUP BY sentiment', (video_id,))
+            sentiment_summary = {'positive': 0, 'negative': 0, 'neutral': 0}
+            for code, count in cursor.fetchall():
+                sentiment_summary[SENTIMENT_LABELS[code]] = count
+            
+            # 分析時の応答と同じく、代表以外の近似重複コメントの件数も返す
+            cursor.execute('SELECT COUNT(*) FROM comment_duplicates WHERE video_id = ?', (video_id,))
+            duplicate_comments = cursor.fetchone()[0]
+        
+        return {
+            'video_info': {
+                'id': video_id,
+                'title': row[0],
+                'view_count': row[1],
+                'like_count': row[2],
+                'comment_count': row[3],
+                'published_at': row[4]
+            },
+            'sentiment_summary': sentiment_summary,
+            'total_comments_analyzed': sum(sentiment_summary.values()),
+            'duplicate_comments': duplicate_comments,
+            'representative_comments': self.get_representative_comments(video_id),
+            'analysis_complete': True,
+            'cached': True,
+            'analyzed_at': row[5]
+        }
+    
+    def acquire_analysis_lease(self, video_id, owner, lease_seconds):
+        now = time.time()
+        with self.get_db_connection() as conn:
+            cursor = conn.cursor()
+            # 期限切れ（分析中にワーカーが落ちた場合など）のリースは引き継ぐ
             cursor.execute('''
-                SELECT 
-                    v.title,
-                    ms.month,
-                    ms.total_comments,
-                    ms.positive_comments,
-                    ms.negative_comments
-                FROM monthly_stats ms
-                JOIN videos v ON ms.video_id = v.id
-                ORDER BY ms.total_comments DESC
-                LIMIT 20
-            ''')
-            top_comments = cursor.fetchall()
+                INSERT INTO analysis_leases (video_id, owner, expires_at)
+                VALUES (?, ?, ?)
+                ON CONFLICT(video_id) DO UPDATE SET
+                    owner = excluded.owner,
+                    expires_at = excluded.expires_at
+                WHERE analysis_leases.expires_at < ?
+            ''', (video_id, owner, now + lease_seconds, now))
+            acquired = cursor.rowcount == 1
+            conn.commit()
+        return acquired
+    
+    def release_analysis_lease(self, video_id, owner):
+        with self.get_db_connection() as conn:
+            conn.execute('DELETE FROM analysis_leases WHERE video_id = ? AND owner = ?', (video_id, owner))
+            conn.commit()
+    
+    def analyze_video_with_lease(self, video_id, video_url, ttl_minutes, force):
+        lease_seconds = int(os.environ.get('ANALYZE_LEASE_SECONDS', 600))
+        owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+        waited = False
+        
+        while True:
+            if self.acquire_analysis_lease(video_id, owner, lease_seconds):
+                try:
+                    # 他のワーカーの分析完了を待っていた場合はその結果を使う
+                    if waited or not force:
+                        stored = self.get_fresh_analysis(video_id, ttl_minutes)
+                        if stored:
+                            return stored
+                    result = self.analyze_video(video_url)
+                    self.request_read_snapshot_publish()
+                    return result
+                finally:
+                    self.release_analysis_lease(video_id, owner)
+            
+            # 別のワーカーが分析中なので、完了（リース解放）を待つ
+            waited = True
+            time.sleep(1)
+            stored = self.get_fresh_analysis(video_id, ttl_minutes)
+            if stored:
+                return stored
+    
+    def analyze_video_cached(self, video_url, force=False, ttl_minutes=None):
+        if ttl_minutes is None:
+            ttl_minutes = float(os.environ.get('ANALYZE_TTL_MINUTES', 60))
+        
+        video_id = self.extract_video_id(video_url)
+        
+        if not force:
+            stored = self.get_fresh_analysis(video_id, ttl_minutes)
+            if stored:
+                return stored
+        
+        # 同じ動画の同時リクエストは1つの分析にまとめる
+        with _inflight_lock:
+            flight = _inflight.get(video_id)
+            leader = flight is None
+            if leader:
+                flight = _inflight[video_id] = AnalysisFlight()
+        
+        if not leader:
+            flight.event.wait()
+            if flight.error:
+                raise flight.error
+            return flight.result
+        
+        try:
+            flight.result = self.analyze_video_with_lease(video_id, video_url, ttl_minutes, force)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with _inflight_lock:
+                del _inflight[video_id]
+            flight.event.set()
+    
+    def get_monthly_rankings(self, month_from=None, month_to=None, video_ids=None):
+        month_from = self.parse_month_filter(month_from)
+        month_to = self.parse_month_filter(month_to)
+        cube = self.get_analytics_cube()
+        
+        with cube.lock:
+            top_negative = cube.rankings('negative', 10, video_ids, month_from, month_to)
+            top_positive = cube.rankings('positive', 10, video_ids, month_from, month_to)
+            top_comments = cube.rankings('comments', 20, video_ids, month_from, month_to)
+        
+        def format_rows(rows, fields):
+            return [
+                dict(
+                    {'title': row['title'], 'month': month_key_to_str(row['month_key'])},
+                    **{field: row[field] for field in fields}
+                ) for row in rows
+            ]
         
         return {
-            'top_negative': [
-                {
-                    'title': row[0],
-                    'month': row[1],
-                    'negative_comments': row[2],
-                    'positive_comments': row[3],
-                    'total_comments': row[4]
-                } for row in top_negative
-            ],
-            'top_positive': [
-                {
-                    'title': row[0],
-                    'month': row[1],
-                    'positive_comments': row[2],
-                    'negative_comments': row[3],
-                    'total_comments': row[4]
-                } for row in top_positive
-            ],
-            'top_comments': [
+            'top_negative': format_rows(top_negative, ['negative_comments', 'positive_comments', 'total_comments']),
+            'top_positive': format_rows(top_positive, ['positive_comments', 'negative_comments', 'total_comments']),
+            'top_comments': format_rows(top_comments, ['total_comments', 'positive_comments', 'negative_comments'])
+        }
+    
+    def build_dashboard(self):
+        # ページ読み込み時に表示するパネル（最終更新日時、ランキング、2つのグラフ）
+        return {
+            'last_updated': read_snapshot_published_at(self.snapshot_path),
+            'rankings': self.get_monthly_rankings(),
+            'monthly_comments_chart': self.get_monthly_comments_chart_data(),
+            'monthly_views_chart': self.get_monthly_views_chart_data()
+        }
+    
+    def publish_dashboard(self):
+        # 公開したスナップショットから初期表示用データを作り、アトミックに置き換える
+        tmp_path = f"{DASHBOARD_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.build_dashboard(), f, ensure_ascii=False, allow_nan=False)
+        os.replace(tmp_path, DASHBOARD_PATH)
+    
+    def get_trending(self, sort='acceleration', limit=20):
+        # 伸び率テーブル（1動画1行）から上位を返すので、スナップショットの履歴の長さに依存しない
+        sort_columns = {
+            'acceleration': 'g.acceleration',
+            'views_per_day': 'g.views_per_day_7d',
+            'likes_per_day': 'g.likes_per_day_7d',
+            'comments_per_day': 'g.comments_per_day_7d'
+        }
+        if sort not in sort_columns:
+            raise ValueError(f"sortは {', '.join(sort_columns)} のいずれかを指定してください")
+        limit = min(max(int(limit), 1), 100)
+        
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT
+                    v.id, v.title, g.view_count, g.like_count, g.comment_count, g.snapshot_at,
+                    g.views_per_day, g.likes_per_day, g.comments_per_day,
+                    g.views_per_day_7d, g.views_per_day_30d,
+                    g.likes_per_day_7d, g.likes_per_day_30d,
+                    g.comments_per_day_7d, g.comments_per_day_30d,
+                    g.acceleration, g.intervals
+                FROM growth_metrics g
+                JOIN videos v ON v.id = g.video_id
+                WHERE g.intervals > 0
+                ORDER BY {sort_columns[sort]} DESC
+                LIMIT ?
+            ''', (limit,))
+            
+            return [
                 {
-                    'title': row[0],
-                    'month': row[1],
-                    'total_comments': row[2],
-                    'positive_comments': row[3],
-                    'negative_comments': row[4]
-                } for row in top_comments
+                    'video_id': row[0],
+                    'title': row[1],
+                    'view_count': row[2],
+                    'like_count': row[3],
+                    'comment_count': row[4],
+                    'snapshot_date': datetime.fromtimestamp(row[5]).strftime('%Y-%m-%d %H:%M:%S'),
+                    'views_per_day': round(row[6], 1),
+                    'likes_per_day': round(row[7], 1),
+                    'comments_per_day': round(row[8], 1),
+                    'views_per_day_7d': round(row[9], 1),
+                    'views_per_day_30d': round(row[10], 1),
+                    'likes_per_day_7d': round(row[11], 1),
+                    'likes_per_day_30d': round(row[12], 1),
+                    'comments_per_day_7d': round(row[13], 1),
+                    'comments_per_day_30d': round(row[14], 1),
+                    'acceleration': round(row[15], 3),
+                    'intervals': row[16]
+                } for row in cursor.fetchall()
             ]
-        }
     
     def get_view_trends(self):
-        with self.get_db_connection() as conn:
+        with self.get_read_connection() as conn:
             cursor = conn.cursor()
             
-            # 各動画のスナップショット履歴を取得
+            # 各動画のスナップショット履歴を取得（統計の更新で1日に複数ある場合は、その日の最新の1件）
             cursor.execute('''
                 SELECT 
                     v.title,
@@ -496,11 +1389,12 @@ class YouTubeAnalyzer:
                     vs.view_count,
                     vs.like_count,
                     vs.comment_count,
-                    strftime('%Y-%m', vs.snapshot_date) as snapshot_month,
-                    vs.snapshot_date
+                    strftime('%Y-%m', MAX(vs.snapshot_date)) as snapshot_month,
+                    MAX(vs.snapshot_date) as snapshot_date
                 FROM videos v
                 JOIN view_snapshots vs ON v.id = vs.video_id
-                ORDER BY v.title, vs.snapshot_date DESC
+                GROUP BY v.id, substr(vs.snapshot_date, 1, 10)
+                ORDER BY v.title, snapshot_date DESC
             ''')
             
             trends = cursor.fetchall()
@@ -549,117 +1443,162 @@ class YouTubeAnalyzer:
     
     def get_representative_comments(self, video_id):
         with self.get_db_connection() as conn:
+            return query_representative_comments(conn.cursor(), [video_id], 5)[video_id]
+    
+    def get_representative_comments_bulk(self, video_ids=None, limit=None):
+        # 複数動画の代表コメントを1回のクエリで取得（video_ids未指定なら全動画）
+        if limit is None:
+            limit = int(os.environ.get('REPRESENTATIVE_COMMENTS_LIMIT', 5))
+        limit = int(limit)
+        if not 1 <= limit <= 50:
+            raise ValueError('件数は1〜50で指定してください')
+        
+        with self.get_read_connection() as conn:
             cursor = conn.cursor()
-            
-            representative = {
-                'positive': [],
-                'negative': [],
-                'neutral': []
-            }
-            
-            for sentiment in ['positive', 'negative', 'neutral']:
-                cursor.execute('''
-                    SELECT text, like_count, sentiment_score, published_at
-                    FROM comments
-                    WHERE video_id = ? AND sentiment_label = ?
-                    ORDER BY like_count DESC, LENGTH(text) DESC
-                    LIMIT 5
-                ''', (video_id, sentiment))
-                
-                comments = cursor.fetchall()
-                representative[sentiment] = [
-                    {
-                        'text': row[0],
-                        'like_count': row[1],
-                        'sentiment_score': row[2],
-                        'published_at': row[3]
-                    } for row in comments
-                ]
-            
-            return representative
+            if video_ids is None:
+                cursor.execute('SELECT id FROM videos')
+                video_ids = [row[0] for row in cursor.fetchall()]
+            return query_representative_comments(cursor, video_ids, limit)
     
-    def get_monthly_comments_chart_data(self):
-        from datetime import datetime, timedelta
-        from collections import defaultdict
-        import calendar
+    def search_comments(self, query, video_id=None, sentiment=None, date_from=None, date_to=None,
+                        sort='relevance', page=1, per_page=20):
+        per_page = min(max(int(per_page), 1), 100)
+        page = max(int(page), 1)
         
-        with self.get_db_connection() as conn:
+        terms = [term for term in query.split() if term]
+        if not terms:
+            raise ValueError('検索語を入力してください')
+        
+        # trigramは3文字以上の語のみインデックスで検索できるため、短い語はLIKEで絞り込む
+        match_terms = [term for term in terms if len(term) >= 3]
+        like_terms = [term for term in terms if len(term) < 3]
+        if like_terms and not match_terms and not video_id:
+            # 短い語だけでは全コメントを展開して走査することになるため、索引で候補を絞れる場合に限る
+            raise ValueError(
+                f"2文字以下の語（{'、'.join(like_terms)}）は、3文字以上の語と組み合わせるか、"
+                "動画を指定して検索してください"
+            )
+        
+        conditions = []
+        params = []
+        
+        if match_terms:
+            from_clause = 'comments_fts f JOIN comments c ON c.rowid = f.rowid'
+            conditions.append('comments_fts MATCH ?')
+            params.append(' AND '.join('"' + term.replace('"', '""') + '"' for term in match_terms))
+        else:
+            from_clause = 'comments c'
+        
+        for term in like_terms:
+            conditions.append("decompress_text(c.text) LIKE ? ESCAPE '\\'")
+            escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params.append(f'%{escaped}%')
+        
+        if video_id:
+            conditions.append('c.video_id = ?')
+            params.append(video_id)
+        if sentiment:
+            if sentiment not in ('positive', 'negative', 'neutral'):
+                raise ValueError('sentimentはpositive/negative/neutralのいずれかを指定してください')
+            conditions.append('c.sentiment = ?')
+            params.append(SENTIMENT_CODES[sentiment])
+        if date_from:
+            conditions.append('c.published_at >= ?')
+            params.append(iso_to_epoch(date_from + 'T00:00:00' if len(date_from) == 10 else date_from))
+        if date_to:
+            # 日付のみ指定された場合はその日の終わりまで含める
+            conditions.append('c.published_at <= ?')
+            params.append(iso_to_epoch(date_to + 'T23:59:59' if len(date_to) == 10 else date_to))
+        
+        where_clause = ' AND '.join(conditions)
+        
+        order_by = {
+            'relevance': 'f.rank' if match_terms else 'c.like_count DESC',
+            'likes': 'c.like_count DESC',
+            'newest': 'c.published_at DESC',
+            'oldest': 'c.published_at ASC'
+        }.get(sort)
+        if order_by is None:
+            raise ValueError('sortはrelevance/likes/newest/oldestのいずれかを指定してください')
+        
+        with self.get_read_connection() as conn:
             cursor = conn.cursor()
             
-            # 各動画のコメント数を公開日からの月別に集計
-            cursor.execute('''
-                SELECT 
-                    v.title,
-                    v.id,
-                    v.published_at,
-                    c.published_at as comment_date,
-                    COUNT(*) as comment_count
-                FROM videos v
-                JOIN comments c ON v.id = c.video_id
-                GROUP BY v.id, v.title, v.published_at, strftime('%Y-%m', c.published_at)
-                ORDER BY v.published_at, c.published_at
-            ''')
-            
-            results = cursor.fetchall()
+            cursor.execute(f'SELECT COUNT(*) FROM {from_clause} WHERE {where_clause}', params)
+            total = cursor.fetchone()[0]
             
-            if not results:
-                return {'message': 'コメントデータがありません。動画を分析してください。', 'data': []}
+            cursor.execute(f'''
+                SELECT
+                    c.id,
+                    c.video_id,
+                    v.title,
+                    c.text,
+                    c.like_count,
+                    c.sentiment_score,
+                    c.sentiment,
+                    c.published_at
+                FROM {from_clause}
+                LEFT JOIN videos v ON v.id = c.video_id
+                WHERE {where_clause}
+                ORDER BY {order_by}
+                LIMIT ? OFFSET ?
+            ''', params + [per_page, (page - 1) * per_page])
             
-            # 動画ごとにデータを整理
-            video_data = defaultdict(lambda: {
-                'title': '',
-                'published_at': '',
-                'monthly_comments': defaultdict(int)
+            rows = cursor.fetchall()
+        
+        return {
+            'query': query,
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'total_pages': math.ceil(total / per_page),
+            'results': [
+                {
+                    'id': row[0],
+                    'video_id': row[1],
+                    'title': row[2],
+                    'text': decode_comment_text(row[3]),
+                    'like_count': row[4],
+                    'sentiment_score': row[5],
+                    'sentiment_label': SENTIMENT_LABELS[row[6]],
+                    'published_at': epoch_to_iso(row[7])
+                } for row in rows
+            ]
+        }
+    
+    def build_chart_datasets(self, cube, video_ids, values):
+        colors = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40', '#FF9F9F', '#9FFF9F', '#9F9FFF']
+        datasets = []
+        
+        for color_index, video_id in enumerate(video_ids):
+            title = cube.titles[cube.video_index[video_id]]
+            datasets.append({
+                'label': title[:30] + ('...' if len(title) > 30 else ''),
+                'data': values[color_index],
+                'borderColor': colors[color_index % len(colors)],
+                'backgroundColor': colors[color_index % len(colors)] + '20',
+                'fill': False,
+                'tension': 0.3
             })
+        
+        return datasets
+    
+    def get_monthly_comments_chart_data(self, month_from=None, month_to=None, video_ids=None):
+        month_from = self.parse_month_filter(month_from)
+        month_to = self.parse_month_filter(month_to)
+        cube = self.get_analytics_cube()
+        
+        # 各動画のコメント数を月別に集計（動画 × 月の配列から切り出し）
+        with cube.lock:
+            chart_video_ids, month_keys, counts = cube.comments_matrix(video_ids, month_from, month_to)
             
-            for row in results:
-                title, video_id, published_at, comment_date, comment_count = row
-                video_data[video_id]['title'] = title
-                video_data[video_id]['published_at'] = published_at
-                
-                # コメント日から年月を取得
-                comment_month = comment_date[:7]  # YYYY-MM形式
-                video_data[video_id]['monthly_comments'][comment_month] = comment_count
-            
-            # 全ての月のラベルを生成（最古の動画から最新まで）
-            all_months = set()
-            for data in video_data.values():
-                all_months.update(data['monthly_comments'].keys())
-            
-            if not all_months:
-                return {'message': 'コメントデータが見つかりません。', 'data': []}
-            
-            sorted_months = sorted(all_months)
+            if not chart_video_ids:
+                return {'message': 'コメントデータがありません。動画を分析してください。', 'data': []}
             
-            # チャート用データを準備
-            chart_data = {
-                'labels': [self.format_month_label(month) for month in sorted_months],
-                'datasets': []
+            return {
+                'labels': [self.format_month_label(month_key_to_str(month_key)) for month_key in month_keys],
+                'datasets': self.build_chart_datasets(cube, chart_video_ids, counts.tolist())
             }
-            
-            # 各動画ごとのデータセットを作成
-            colors = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40', '#FF9F9F', '#9FFF9F', '#9F9FFF']
-            color_index = 0
-            
-            for video_id, data in video_data.items():
-                dataset = {
-                    'label': data['title'][:30] + ('...' if len(data['title']) > 30 else ''),
-                    'data': [],
-                    'borderColor': colors[color_index % len(colors)],
-                    'backgroundColor': colors[color_index % len(colors)] + '20',
-                    'fill': False,
-                    'tension': 0.3
-                }
-                
-                # 各月のコメント数を追加
-                for month in sorted_months:
-                    comment_count = data['monthly_comments'].get(month, 0)
-                    dataset['data'].append(comment_count)
-                
-                chart_data['datasets'].append(dataset)
-                color_index += 1
-            
-            return chart_data
     
     def format_month_label(self, month_str):
         # YYYY-MM形式をYYYY年MM月形式に変換
@@ -669,97 +1608,89 @@ class YouTubeAnalyzer:
         except:
             return month_str
     
-    def get_monthly_views_chart_data(self):
-        from datetime import datetime, timedelta
-        from collections import defaultdict
+    def get_monthly_views_chart_data(self, month_from=None, month_to=None, video_ids=None):
+        month_from = self.parse_month_filter(month_from)
+        month_to = self.parse_month_filter(month_to)
+        cube = self.get_analytics_cube()
         
-        with self.get_db_connection() as conn:
-            cursor = conn.cursor()
+        # 各動画の月末時点（その月の最新スナップショット）の再生数
+        with cube.lock:
+            chart_video_ids, month_keys, views = cube.views_matrix(video_ids, month_from, month_to)
             
-            # 各動画のスナップショット履歴を月別に整理
-            cursor.execute('''
-                SELECT 
-                    v.title,
-                    v.id,
-                    vs.view_count,
-                    strftime('%Y-%m', vs.snapshot_date) as snapshot_month,
-                    vs.snapshot_date
-                FROM videos v
-                JOIN view_snapshots vs ON v.id = vs.video_id
-                ORDER BY vs.snapshot_date ASC
-            ''')
-            
-            results = cursor.fetchall()
-            
-            if not results:
+            if not chart_video_ids:
                 return {'message': 'スナップショットデータがありません。複数回分析してください。', 'data': []}
             
-            # 動画ごとにデータを整理
-            video_data = defaultdict(lambda: {
-                'title': '',
-                'monthly_views': defaultdict(int)
-            })
+            values = [
+                [None if math.isnan(value) else int(value) for value in row]
+                for row in views.tolist()
+            ]
             
-            for row in results:
-                title, video_id, view_count, snapshot_month, snapshot_date = row
-                video_data[video_id]['title'] = title
-                
-                # 同じ月の場合は最新の値を使用
-                if snapshot_month not in video_data[video_id]['monthly_views'] or \
-                   snapshot_date > video_data[video_id]['monthly_views'][snapshot_month + '_date']:
-                    video_data[video_id]['monthly_views'][snapshot_month] = view_count
-                    video_data[video_id]['monthly_views'][snapshot_month + '_date'] = snapshot_date
-            
-            # 全ての月のラベルを生成
-            all_months = set()
-            for data in video_data.values():
-                for key in data['monthly_views'].keys():
-                    if not key.endswith('_date'):
-                        all_months.add(key)
-            
-            if not all_months:
-                return {'message': '再生数データが見つかりません。', 'data': []}
-            
-            sorted_months = sorted(all_months)
-            
-            # チャート用データを準備
-            chart_data = {
-                'labels': [self.format_month_label(month) for month in sorted_months],
-                'datasets': []
+            return {
+                'labels': [self.format_month_label(month_key_to_str(month_key)) for month_key in month_keys],
+                'datasets': self.build_chart_datasets(cube, chart_video_ids, values)
             }
-            
-            # 各動画ごとのデータセットを作成
-            colors = ['#FF6384', '#36A2EB', '#FFCE56', '#4BC0C0', '#9966FF', '#FF9F40', '#FF9F9F', '#9FFF9F', '#9F9FFF']
-            color_index = 0
-            
-            for video_id, data in video_data.items():
-                dataset = {
-                    'label': data['title'][:30] + ('...' if len(data['title']) > 30 else ''),
-                    'data': [],
-                    'borderColor': colors[color_index % len(colors)],
-                    'backgroundColor': colors[color_index % len(colors)] + '20',
-                    'fill': False,
-                    'tension': 0.3
-                }
-                
-                # 各月の再生数を追加
-                for month in sorted_months:
-                    view_count = data['monthly_views'].get(month, None)
-                    dataset['data'].append(view_count)
-                
-                chart_data['datasets'].append(dataset)
-                color_index += 1
-            
-            return chart_data
     
-    def analyze_csv_urls(self):
-        import csv
-        import os
+    def get_daily_views_chart_data(self, month_from=None, month_to=None, video_ids=None):
+        month_from = self.parse_month_filter(month_from)
+        month_to = self.parse_month_filter(month_to)
+        cube = self.get_analytics_cube()
+        
+        # 開始月の指定がなければ、終了日（指定がなければ現在）までの DAILY_VIEWS_CHART_DAYS 日
+        end = datetime.strptime(month_key_to_str(month_key_add(month_to, 1)) + '-01', '%Y-%m-%d') if month_to else datetime.now() + timedelta(days=1)
+        date_to = end.strftime('%Y-%m-%d')
+        if month_from:
+            date_from = month_key_to_str(month_from) + '-01'
+        else:
+            date_from = (end - timedelta(days=DAILY_VIEWS_CHART_DAYS)).strftime('%Y-%m-%d')
+        
+        with self.get_read_connection() as conn:
+            cursor = conn.cursor()
+            # 各動画の日ごとの最新スナップショットの再生数
+            # （CROSS JOIN で結合順を固定し、動画ごとに idx_view_snapshots_video_date の期間の範囲だけを読む）
+            cursor.execute('''
+                SELECT vs.video_id, substr(vs.snapshot_date, 1, 10) AS day, vs.view_count, MAX(vs.snapshot_date)
+                FROM videos v
+                CROSS JOIN view_snapshots vs
+                    ON vs.video_id = v.id
+                    AND vs.snapshot_date >= ?
+                    AND vs.snapshot_date < ?
+                WHERE ? IS NULL OR v.id IN (SELECT value FROM json_each(?))
+                GROUP BY vs.video_id, day
+                ORDER BY vs.video_id, day
+            ''', (date_from, date_to, *[json.dumps(video_ids) if video_ids is not None else None] * 2))
+            rows = cursor.fetchall()
         
+        selected = None if video_ids is None else set(video_ids)
+        views = defaultdict(dict)
+        for video_id, day, view_count, _ in rows:
+            if video_id in cube.video_index and (selected is None or video_id in selected):
+                views[video_id][day] = view_count
+        
+        if not views:
+            return {'message': 'スナップショットデータがありません。複数回分析してください。', 'data': []}
+        
+        days = sorted({day for values in views.values() for day in values})
+        # 月別グラフと同じく、最初のスナップショットの順に並べる
+        chart_video_ids = sorted(views, key=lambda video_id: min(views[video_id]))
+        
+        with cube.lock:
+            return {
+                'labels': [self.format_day_label(day) for day in days],
+                'datasets': self.build_chart_datasets(
+                    cube, chart_video_ids, [[views[video_id].get(day) for day in days] for video_id in chart_video_ids]
+                )
+            }
+    
+    def format_day_label(self, day_str):
+        # YYYY-MM-DD形式をYYYY年MM月DD日形式に変換
+        year, month, day = day_str.split('-')
+        return f"{year}年{month}月{day}日"
+    
+    def load_csv_urls(self):
         csv_path = os.path.join(os.path.dirname(__file__), '__46_1st_12th______.csv')
         
         if not os.path.exists(csv_path):
-            return {'error': 'CSVファイルが見つかりません', 'success': False}
+            raise ValueError('CSVファイルが見つかりません')
         
         urls = []
         try:
@@ -769,18 +1700,315 @@ class YouTubeAnalyzer:
                     if url and url.startswith('https://www.youtube.com/'):
                         urls.append(url)
         except Exception as e:
-            return {'error': f'CSVファイル読み込みエラー: {str(e)}', 'success': False}
+            raise ValueError(f'CSVファイル読み込みエラー: {str(e)}')
         
         if not urls:
-            return {'error': 'CSVファイルにYouTube URLが見つかりません', 'success': False}
+            raise ValueError('CSVファイルにYouTube URLが見つかりません')
+        
+        return urls
+    
+    def analyze_csv_urls(self):
+        try:
+            urls = self.load_csv_urls()
+        except ValueError as e:
+            return {'error': str(e), 'success': False}
+        
+        return self.analyze_url_list(urls)
+    
+    def get_discovery_playlists(self):
+        # DISCOVERY_CHANNEL_IDS（UC...）はアップロード再生リスト（UU...）に変換（API呼び出し不要）
+        channel_ids = [c.strip() for c in os.environ.get('DISCOVERY_CHANNEL_IDS', '').split(',') if c.strip()]
+        playlist_ids = [p.strip() for p in os.environ.get('DISCOVERY_PLAYLIST_IDS', '').split(',') if p.strip()]
+        
+        uploads = ['UU' + channel_id[2:] for channel_id in channel_ids if channel_id.startswith('UC')]
+        return list(dict.fromkeys(uploads + playlist_ids))
+    
+    def discover_videos(self, playlist_ids=None):
+        """再生リストを playlistItems.list（50件で1ユニット）で走査し、未登録の動画URLを返す"""
+        if playlist_ids is None:
+            playlist_ids = self.get_discovery_playlists()
+        
+        title_pattern = os.environ.get('DISCOVERY_TITLE_PATTERN')
+        title_pattern = re.compile(title_pattern) if title_pattern else None
+        
+        with self.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id FROM videos UNION SELECT video_id FROM discovered_videos')
+            known = {row[0] for row in cursor.fetchall()}
+            cursor.execute('SELECT playlist_id FROM discovery_state WHERE last_full_scan_at IS NOT NULL')
+            fully_scanned = {row[0] for row in cursor.fetchall()}
+        
+        new_videos = []
+        seen = set()
+        quota_used = 0
+        
+        for playlist_id in playlist_ids:
+            # アップロード再生リストは新しい順なので、全件走査済みなら既知の動画が出た時点で打ち切る
+            incremental = playlist_id.startswith('UU') and playlist_id in fully_scanned
+            page_token = None
+            pages = 0
+            
+            try:
+                while True:
+                    response = self.youtube.playlistItems().list(
+                        part='snippet,contentDetails',
+                        playlistId=playlist_id,
+                        maxResults=50,
+                        pageToken=page_token
+                    ).execute()
+                    quota_used += 1
+                    pages += 1
+                    
+                    reached_known = False
+                    for item in response['items']:
+                        video_id = item['contentDetails']['videoId']
+                        if video_id in known:
+                            reached_known = True
+                            continue
+                        # 非公開・削除済みの動画には公開日時がない
+                        if not item['contentDetails'].get('videoPublishedAt') or video_id in seen:
+                            continue
+                        if title_pattern and not title_pattern.search(item['snippet']['title']):
+                            continue
+                        seen.add(video_id)
+                        new_videos.append((video_id, playlist_id))
+                    
+                    page_token = response.get('nextPageToken')
+                    if not page_token or (incremental and reached_known):
+                        break
+                
+                if not page_token:
+                    with self.get_db_connection() as conn:
+                        conn.execute('''
+                            INSERT OR REPLACE INTO discovery_state (playlist_id, last_full_scan_at)
+                            VALUES (?, CURRENT_TIMESTAMP)
+                        ''', (playlist_id,))
+                        conn.commit()
+                
+                print(f"再生リスト {playlist_id}: {pages}ページ走査")
+            
+            except Exception as e:
+                print(f"再生リスト取得エラー ({playlist_id}): {e}")
+        
+        with self.get_db_connection() as conn:
+            conn.executemany(
+                'INSERT OR IGNORE INTO discovered_videos (video_id, playlist_id) VALUES (?, ?)',
+                new_videos
+            )
+            conn.commit()
+        
+        print(f"新しい動画: {len(new_videos)}件 (消費クォータ: {quota_used})")
+        
+        return {
+            'new_urls': [f'https://www.youtube.com/watch?v={video_id}' for video_id, _ in new_videos],
+            'quota_used': quota_used,
+            'playlists': playlist_ids
+        }
+    
+    def get_tracked_urls(self, discovered_urls=None):
+        # 分析対象 = 探索で見つかった動画 + 登録済みの動画 + CSV（任意の追加指定）
+        with self.get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT video_id FROM discovered_videos WHERE excluded_at IS NULL UNION SELECT id FROM videos')
+            urls = [f'https://www.youtube.com/watch?v={row[0]}' for row in cursor.fetchall()]
+        
+        try:
+            csv_urls = self.load_csv_urls()
+        except ValueError:
+            csv_urls = []
+        
+        tracked = {}
+        for url in (discovered_urls or []) + csv_urls + urls:
+            try:
+                tracked.setdefault(self.extract_video_id(url), url)
+            except ValueError:
+                continue
+        
+        if not tracked:
+            raise ValueError('分析対象の動画がありません。DISCOVERY_CHANNEL_IDS / DISCOVERY_PLAYLIST_IDS またはCSVファイルを設定してください')
+        
+        return list(tracked.values())
+    
+    def forget_discovered_video(self, video_id):
+        with self.get_db_connection() as conn:
+            conn.execute('DELETE FROM discovered_videos WHERE video_id = ? AND excluded_at IS NULL', (video_id,))
+            conn.commit()
+    
+    def estimate_refresh_cost(self, comment_count):
+        # videos.list 1ユニット + commentThreads.list 1ページ(100件)につき1ユニット
+        if comment_count is None:
+            # 未分析の動画は最大ページ数で見積もる
+            return 1 + 2 * (2000 // 100)
+        
+        pages = max(1, math.ceil(min(comment_count, 2000) / 100))
+        # 目標件数の8割に届かない場合は relevance 順でも再取得される
+        if comment_count < 2000 * 0.8:
+            pages *= 2
+        return 1 + pages
+    
+    def estimate_stats_refresh_cost(self):
+        # 1日分の統計更新のクォータ消費（実行回数 × videos.list の呼び出し回数）
+        if STATS_REFRESH_INTERVAL_MINUTES <= 0:
+            return 0
+        with self.get_db_connection() as conn:
+            video_count = conn.execute('SELECT COUNT(*) FROM videos').fetchone()[0]
+        runs_per_day = math.ceil(24 * 60 / STATS_REFRESH_INTERVAL_MINUTES)
+        return runs_per_day * math.ceil(video_count / VIDEOS_LIST_BATCH_SIZE)
+    
+    def get_refresh_priorities(self, urls=None):
+        min_interval = float(os.environ.get('REFRESH_MIN_INTERVAL_DAYS', 1))
+        max_interval = float(os.environ.get('REFRESH_MAX_INTERVAL_DAYS', 30))
+        
+        if urls is None:
+            urls = self.get_tracked_urls()
+        
+        now = datetime.now()
+        recent_cutoff = calendar.timegm((datetime.utcnow() - timedelta(days=7)).timetuple())
+        
+        with self.get_db_connection() as conn:
+            cursor = conn.cursor()
+            
+            # 再生数の伸び（統計だけの更新で細かく記録されたスナップショットの7日移動平均）
+            cursor.execute('SELECT video_id, views_per_day_7d FROM growth_metrics WHERE intervals > 0')
+            growth = dict(cursor.fetchall())
+            
+            # 直近7日間に投稿されたコメント数
+            cursor.execute('''
+                SELECT video_id, COUNT(*)
+                FROM comments
+                WHERE published_at >= ?
+                GROUP BY video_id
+            ''', (recent_cutoff,))
+            recent_comments = dict(cursor.fetchall())
+            
+            cursor.execute('SELECT id, view_count, comment_count, published_at, analyzed_at FROM videos')
+            videos = {row[0]: row[1:] for row in cursor.fetchall()}
+        
+        priorities = []
+        for url in urls:
+            try:
+                video_id = self.extract_video_id(url)
+            except ValueError:
+                continue
+            
+            if video_id not in videos or videos[video_id][3] is None:
+                # 未分析の動画は最優先
+                priorities.append({
+                    'url': url,
+                    'video_id': video_id,
+                    'priority': float('inf'),
+                    'views_per_day': None,
+                    'comments_per_day': None,
+                    'interval_days': 0,
+                    'days_since_refresh': None,
+                    'due': True,
+                    'estimated_cost': self.estimate_refresh_cost(None)
+                })
+                continue
+            
+            view_count, comment_count, published_at, analyzed_at = videos[video_id]
+            analyzed = datetime.strptime(analyzed_at[:19], '%Y-%m-%d %H:%M:%S')
+            
+            if video_id in growth:
+                views_per_day = max(0, growth[video_id] or 0)
+            else:
+                # 伸び率がまだない（スナップショットが1件のみの）場合は公開日からの平均で代用
+                published = datetime.strptime(published_at[:19], '%Y-%m-%dT%H:%M:%S')
+                age_days = max((analyzed - published).total_seconds() / 86400, 1)
+                views_per_day = (view_count or 0) / age_days
+            
+            comments_per_day = recent_comments.get(video_id, 0) / 7
+            
+            # 伸びが大きいほど優先度が高く、更新間隔が短くなる
+            priority = math.log10(1 + views_per_day) + math.log10(1 + comments_per_day * 10)
+            interval_days = min(max(max_interval * 2 ** (-priority), min_interval), max_interval)
+            days_since_refresh = (now - analyzed).total_seconds() / 86400
+            
+            priorities.append({
+                'url': url,
+                'video_id': video_id,
+                'priority': round(priority, 3),
+                'views_per_day': round(views_per_day, 1),
+                'comments_per_day': round(comments_per_day, 1),
+                'interval_days': round(interval_days, 2),
+                'days_since_refresh': round(days_since_refresh, 2),
+                'due': days_since_refresh >= interval_days,
+                'estimated_cost': self.estimate_refresh_cost(comment_count)
+            })
+        
+        priorities.sort(key=lambda x: x['priority'], reverse=True)
+        return priorities
+    
+    def analyze_scheduled_urls(self, quota_budget=None):
+        if quota_budget is None:
+            quota_budget = int(os.environ.get('DAILY_QUOTA_BUDGET', 10000))
+        
+        # 探索で見つかった新しい動画は未分析なので最優先になる
+        discovery = {'new_urls': [], 'quota_used': 0}
+        if self.get_discovery_playlists():
+            discovery = self.discover_videos()
+        
+        try:
+            priorities = self.get_refresh_priorities(self.get_tracked_urls(discovery['new_urls']))
+        except ValueError as e:
+            return {'error': str(e), 'success': False}
+        
+        # 統計の更新も同じ1日の予算を使うので、その見込み分を先に差し引いてから
+        # 優先度の高い順にクォータ予算へ詰める
+        stats_refresh_cost = self.estimate_stats_refresh_cost()
+        selected = []
+        skipped = 0
+        remaining = quota_budget - discovery['quota_used'] - stats_refresh_cost
+        for item in priorities:
+            if not item['due']:
+                continue
+            if item['estimated_cost'] > remaining:
+                skipped += 1
+                continue
+            selected.append(item['url'])
+            remaining -= item['estimated_cost']
+        
+        print(
+            f"更新対象: {len(selected)}件 (予算超過で見送り: {skipped}件, 見積もり消費: {quota_budget - remaining}/{quota_budget}, "
+            f"うち統計の更新: {stats_refresh_cost})"
+        )
         
+        if not selected:
+            return {
+                'success': True,
+                'total_urls': 0,
+                'successful': 0,
+                'failed': 0,
+                'skipped_over_budget': skipped,
+                'discovered': len(discovery['new_urls']),
+                'stats_refresh_quota': stats_refresh_cost,
+                'results': [],
+                'message': '更新が必要な動画はありません'
+            }
+        
+        result = self.analyze_url_list(selected)
+        result['skipped_over_budget'] = skipped
+        result['discovered'] = len(discovery['new_urls'])
+        result['estimated_quota_used'] = quota_budget - remaining
+        result['stats_refresh_quota'] = stats_refresh_cost
+        return result
+    
+    def analyze_url_list(self, urls):
         results = []
         failed_count = 0
         
         for i, url in enumerate(urls, 1):
+            if i > 1 and (i - 1) % SNAPSHOT_CHECKPOINT_VIDEOS == 0:
+                # 途中経過もダッシュボードに反映する
+                self.publish_read_snapshot()
             try:
                 print(f"分析中 {i}/{len(urls)}: {url}")
+                self.report_progress('url_start', index=i, total=len(urls), url=url)
                 result = self.analyze_video(url)
+                self.report_progress(
+                    'url_done', index=i, total=len(urls), url=url,
+                    title=result['video_info']['title'], comments=result['total_comments_analyzed']
+                )
                 results.append({
                     'url': url,
                     'success': True,
@@ -790,6 +2018,11 @@ class YouTubeAnalyzer:
                 })
             except Exception as e:
                 print(f"エラー {i}/{len(urls)}: {str(e)}")
+                self.report_progress('url_error', index=i, total=len(urls), url=url, error=str(e))
+                if isinstance(e, VideoNotFoundError):
+                    # 削除・非公開になった動画を毎日再試行（とクォータの確保）しないよう探索結果から外す
+                    # 再び公開されれば、次の探索で新しい動画として見つかる
+                    self.forget_discovered_video(self.extract_video_id(url))
                 failed_count += 1
                 results.append({
                     'url': url,
@@ -797,6 +2030,9 @@ class YouTubeAnalyzer:
                     'error': str(e)
                 })
         
+        if urls:
+            self.publish_read_snapshot()
+        
         return {
             'success': True,
             'total_urls': len(urls),
@@ -807,10 +2043,22 @@ class YouTubeAnalyzer:
         }
     
     def get_all_videos(self):
-        with self.get_db_connection() as conn:
+        with self.get_read_connection() as conn:
             cursor = conn.cursor()
             
-            cursor.execute('''
+            if self.has_read_snapshot():
+                # スナップショットでは件数が事前集計されている
+                counts = 'COALESCE(s.comments_analyzed, 0), COALESCE(s.snapshots_count, 0)'
+                summary = 'LEFT JOIN video_summary s ON v.id = s.video_id'
+            else:
+                counts = '''
+                    (SELECT COUNT(*) FROM comments c WHERE c.video_id = v.id)
+                        + (SELECT COUNT(*) FROM comment_duplicates d WHERE d.video_id = v.id),
+                    (SELECT COUNT(*) FROM view_snapshots vs WHERE vs.video_id = v.id)
+                '''
+                summary = ''
+            
+            cursor.execute(f'''
                 SELECT 
                     v.id,
                     v.title,
@@ -819,12 +2067,9 @@ class YouTubeAnalyzer:
                     v.comment_count,
                     v.published_at,
                     v.created_at,
-                    COUNT(c.id) as total_comments_analyzed,
-                    COUNT(vs.id) as snapshots_count
+                    {counts}
                 FROM videos v
-                LEFT JOIN comments c ON v.id = c.video_id
-                LEFT JOIN view_snapshots vs ON v.id = vs.video_id
-                GROUP BY v.id
+                {summary}
                 ORDER BY v.created_at DESC
             ''')
             
@@ -851,12 +2096,21 @@ class YouTubeAnalyzer:
             # 関連データを削除
             cursor.execute('DELETE FROM monthly_stats WHERE video_id = ?', (video_id,))
             cursor.execute('DELETE FROM view_snapshots WHERE video_id = ?', (video_id,))
+            cursor.execute('DELETE FROM growth_metrics WHERE video_id = ?', (video_id,))
+            cursor.execute('DELETE FROM comment_duplicates WHERE video_id = ?', (video_id,))
             cursor.execute('DELETE FROM comments WHERE video_id = ?', (video_id,))
             cursor.execute('DELETE FROM videos WHERE id = ?', (video_id,))
+            # 行を消すと次の探索で新しい動画として再登録されるため、除外済みとして残す
+            cursor.execute('''
+                INSERT INTO discovered_videos (video_id, excluded_at) VALUES (?, CURRENT_TIMESTAMP)
+                ON CONFLICT(video_id) DO UPDATE SET excluded_at = excluded.excluded_at
+            ''', (video_id,))
+            record_analytics_change(cursor, video_id)
             
             conn.commit()
-            
-            return {'success': True, 'message': f'動画データを削除しました: {video_id}'}
+        
+        self.request_read_snapshot_publish()
+        return {'success': True, 'message': f'動画データを削除しました: {video_id}'}
     
     def clear_all_data(self):
         with self.get_db_connection() as conn:
@@ -865,9 +2119,13 @@ class YouTubeAnalyzer:
             # 全テーブルをクリア
             cursor.execute('DELETE FROM monthly_stats')
             cursor.execute('DELETE FROM view_snapshots')
+            cursor.execute('DELETE FROM growth_metrics')
+            cursor.execute('DELETE FROM comment_duplicates')
             cursor.execute('DELETE FROM comments')
             cursor.execute('DELETE FROM videos')
+            record_analytics_change(cursor, None)
             
             conn.commit()
-            
-            return {'success': True, 'message': 'すべてのデータを削除しました'}
\ No newline at end of file
+        
+        self.request_read_snapshot_publish()
+        return {'success': True, 'message': 'すべてのデータを削除しました'}
\ No newline at end of file